@@ -1,43 +1,208 @@
 # scripts/convert_model.py
 
 from ultralytics import YOLO
+import json
 import os
+import sys
+
+# Add project root to the Python path to allow sibling imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # --- Configuration ---
 # Assumes the script is run from the project's root directory.
 # Example: python scripts/convert_model.py
 MODEL_DIR = "models"
-INPUT_MODEL_NAME = "yolo11s.pt" # The model mentioned in your architecture doc
+INPUT_MODEL_NAME = "yolo11m.pt" # The model loaded by src/main_debug.py
+IMG_SIZE = (384, 640) # (height, width): matches 16:9 cameras, so less of the input is letterbox padding
+BATCH_SIZE = 1 # Frames per inference run; 4-8 raises GPU throughput at the cost of that many frames of latency
+EXPORT_FP16 = True # Also write an FP16 model for GPUs without TensorRT (needs CUDA to export)
+QUANTIZE_INT8 = True # Also write an INT8 (QDQ) model for TensorRT / VNNI inference
+SETTINGS_FILE = "config/settings.json" # Calibration frames are sampled from this video source
+CALIBRATION_FRAMES = 64
+INT8_MAX_SCORE_ERROR = 0.05 # Largest mean class-score drift from FP32 accepted for the INT8 model
+INT8_MAX_BOX_ERROR = 5.0 # Same for box coordinates, in input pixels
+INT8_CHECK_ANCHORS = 100 # Highest-scoring FP32 predictions compared per calibration frame
 # --- End Configuration ---
 
-def convert_to_onnx():
+def convert_to_onnx(half=False):
     """
     Loads a YOLO .pt model and exports it to ONNX format.
-    The output file will be saved in the same directory with a .onnx extension.
+    The output file will be saved in the same directory with a .onnx extension,
+    or .fp16.onnx when half is set.
     """
     input_model_path = os.path.join(MODEL_DIR, INPUT_MODEL_NAME)
 
     if not os.path.exists(input_model_path):
         print(f"Error: Model file not found at '{input_model_path}'")
         print("Please ensure the model exists and you are running this script from the project root directory.")
-        return
+        return None
 
     try:
         print(f"Loading model from '{input_model_path}'...")
         # Load the YOLO model
         model = YOLO(input_model_path)
 
-        print("Starting ONNX export...")
-        # Export the model to ONNX format. The output will be 'models/yolo11m.onnx'
-        model.export(format='onnx')
-
-        output_model_name = INPUT_MODEL_NAME.replace('.pt', '.onnx')
-        print(f"\n✅ Successfully converted model to '{os.path.join(MODEL_DIR, output_model_name)}'")
+        print(f"Starting {'FP16 ' if half else ''}ONNX export...")
+        # Export the model to ONNX format with a fixed input shape. The output will be 'models/yolo11m.onnx'
+        if half:
+            exported_path = model.export(format='onnx', imgsz=IMG_SIZE, batch=BATCH_SIZE, dynamic=False, simplify=True,
+                                         half=True, device=0)
+            output_model_path = os.path.join(MODEL_DIR, INPUT_MODEL_NAME.replace('.pt', '.fp16.onnx'))
+            os.replace(exported_path, output_model_path)
+        else:
+            model.export(format='onnx', imgsz=IMG_SIZE, batch=BATCH_SIZE, dynamic=False, simplify=True)
+            output_model_path = os.path.join(MODEL_DIR, INPUT_MODEL_NAME.replace('.pt', '.onnx'))
+        print(f"\n✅ Successfully converted model to '{output_model_path}'")
+        return output_model_path
 
     except Exception as e:
         print(f"\n❌ An error occurred during conversion: {e}")
         print("Please ensure 'ultralytics' and 'onnx' are installed (`pip install ultralytics onnx`).")
+        return None
+
+
+class FrameCalibrationReader:
+    """Feeds letterboxed frames from the configured video source to the ONNX quantizer."""
+    def __init__(self, input_name, video_source, num_frames=CALIBRATION_FRAMES):
+        from src.capture.stream_handler import get_video_capture
+        from src.detection.onnx_detector import letterbox
+        import cv2
+        import numpy as np
+
+        cap = get_video_capture(video_source)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or num_frames
+        step = max(total // num_frames, 1)
+
+        blobs = []
+        for index in range(0, total, step):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            padded, _, _ = letterbox(frame, IMG_SIZE)
+            blobs.append(cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).transpose(2, 0, 1).astype(np.float32) / 255.0)
+            if len(blobs) >= num_frames:
+                break
+        cap.release()
+
+        # The exported model has a fixed batch size, so frames are fed in groups of it.
+        self.batches = [{input_name: np.stack(blobs[i:i + BATCH_SIZE])}
+                        for i in range(0, len(blobs) - BATCH_SIZE + 1, BATCH_SIZE)]
+        self.iterator = iter(self.batches)
+
+    def get_next(self):
+        return next(self.iterator, None)
+
+
+def detection_head_nodes(onnx_model_path):
+    """
+    Returns the names of the detection head's decode nodes: everything between
+    the last trained convolutions and the model output (DFL, box decoding,
+    Sigmoid and the final Concat). Box coordinates (0-640) and class scores
+    (0-1) meet in that Concat, so quantizing it would give both one INT8 scale
+    and round every class score to zero.
+    """
+    import onnx
+
+    graph = onnx.load(onnx_model_path).graph
+    producers = {output: node for node in graph.node for output in node.output}
+    head_nodes, seen = [], set()
+    stack = [producers[output.name] for output in graph.output if output.name in producers]
+    while stack:
+        node = stack.pop()
+        if node.name in seen:
+            continue
+        seen.add(node.name)
+        input_producer = producers.get(node.input[0]) if node.input else None
+        if node.op_type == 'Conv' and (input_producer is None or input_producer.op_type != 'Softmax'):
+            continue # A trained cv2/cv3 conv; only the fixed DFL conv (fed by Softmax) is part of the decode
+        head_nodes.append(node.name)
+        if node.op_type != 'Shape': # Shape only reads a feature map's dimensions
+            stack.extend(producers[name] for name in node.input if name in producers)
+    return head_nodes
+
+
+def check_int8_outputs(fp32_model_path, int8_model_path, batches):
+    """
+    Runs the FP32 and INT8 models on the calibration batches and compares the
+    boxes and class scores of the FP32 model's highest-scoring predictions.
+
+    Returns:
+        tuple: (mean box error in pixels, mean class-score error).
+    """
+    import numpy as np
+    import onnxruntime as ort
+
+    fp32 = ort.InferenceSession(fp32_model_path, providers=['CPUExecutionProvider'])
+    int8 = ort.InferenceSession(int8_model_path, providers=['CPUExecutionProvider'])
+    box_errors, score_errors = [], []
+    for feed in batches:
+        # (batch, 4 + classes, anchors) -> (batch, anchors, 4 + classes)
+        expected = fp32.run(None, feed)[0].transpose(0, 2, 1)
+        actual = int8.run(None, feed)[0].transpose(0, 2, 1)
+        for ref, out in zip(expected, actual):
+            best_class = ref[:, 4:].argmax(axis=1)
+            ref_scores = ref[np.arange(len(ref)), 4 + best_class]
+            top = np.argsort(ref_scores)[-INT8_CHECK_ANCHORS:]
+            box_errors.append(np.abs(ref[top, :4] - out[top, :4]).mean())
+            score_errors.append(np.abs(ref_scores[top] - out[top, 4 + best_class[top]]).mean())
+    return float(np.mean(box_errors)), float(np.mean(score_errors))
+
+
+def quantize_to_int8(onnx_model_path):
+    """
+    Statically quantizes an ONNX model to INT8 in QDQ format, calibrating on
+    frames from the configured video source. The QDQ model runs on INT8 tensor
+    cores through TensorRT and on VNNI through the CPU provider.
+    """
+    try:
+        import onnxruntime as ort
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+        with open(SETTINGS_FILE, 'r') as f:
+            video_source = json.load(f).get('video_source')
+        if not video_source:
+            print(f"Error: 'video_source' not found in {SETTINGS_FILE}, cannot calibrate.")
+            return
+
+        input_name = ort.InferenceSession(onnx_model_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+        print(f"Collecting {CALIBRATION_FRAMES} calibration frames from '{video_source}'...")
+        reader = FrameCalibrationReader(input_name, video_source)
+
+        if not reader.batches:
+            print(f"Error: no calibration frames could be read from '{video_source}'.")
+            return
+
+        int8_model_path = onnx_model_path.replace('.onnx', '.int8.onnx')
+        head_nodes = detection_head_nodes(onnx_model_path)
+        print(f"Starting INT8 quantization ({len(head_nodes)} detection head nodes kept in float)...")
+        quantize_static(onnx_model_path, int8_model_path, reader,
+                        quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QInt8,
+                        weight_type=QuantType.QInt8,
+                        per_channel=True,
+                        nodes_to_exclude=head_nodes)
+
+        box_error, score_error = check_int8_outputs(onnx_model_path, int8_model_path, reader.batches)
+        print(f"INT8 vs FP32 on calibration frames: mean box error {box_error:.2f}px, mean score error {score_error:.3f}")
+        if box_error > INT8_MAX_BOX_ERROR or score_error > INT8_MAX_SCORE_ERROR:
+            os.remove(int8_model_path)
+            print(f"\n❌ The INT8 model deviates too far from FP32 and was removed. "
+                  f"Detection will use '{onnx_model_path}' instead.")
+            return
+        print(f"\n✅ Successfully quantized model to '{int8_model_path}'")
+
+    except Exception as e:
+        print(f"\n❌ An error occurred during quantization: {e}")
 
 
 if __name__ == "__main__":
-    convert_to_onnx()
\ No newline at end of file
+    if EXPORT_FP16:
+        import torch
+        if torch.cuda.is_available():
+            convert_to_onnx(half=True)
+        else:
+            print("Skipping FP16 export: it requires a CUDA device.")
+    onnx_path = convert_to_onnx()
+    if onnx_path and QUANTIZE_INT8:
+        quantize_to_int8(onnx_path)
@@ -1,13 +1,23 @@
 import cv2
 import time
 
-def get_video_capture(source):
+def _open_capture(source_cv, hw_accel):
+    """Opens the source with the FFMPEG backend, asking for hardware decoding if requested."""
+    if hw_accel:
+        # VIDEO_ACCELERATION_ANY picks NVDEC/VAAPI/D3D11 when available and
+        # silently falls back to software decoding otherwise.
+        return cv2.VideoCapture(source_cv, cv2.CAP_FFMPEG,
+                                [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+    return cv2.VideoCapture(source_cv, cv2.CAP_FFMPEG)
+
+def get_video_capture(source, hw_accel=False):
     """
     Initializes and returns a cv2.VideoCapture object.
     Retries connection if it fails initially.
 
     Args:
         source (str or int): The video source (e.g., '0' for webcam, or path to video file/URL).
+        hw_accel (bool): Decode on the GPU's video engine (e.g. NVDEC) when FFMPEG supports it.
 
     Returns:
         cv2.VideoCapture: The video capture object.
@@ -22,23 +32,31 @@ def get_video_capture(source):
         source_cv = source_str
 
     # Add FFMPEG backend preference for better RTSP/IP cam support
-    cap = cv2.VideoCapture(source_cv, cv2.CAP_FFMPEG)
+    cap = _open_capture(source_cv, hw_accel)
     
     if cap.isOpened():
         print(f"Successfully opened video source: {source}")
+        _report_hw_accel(cap, hw_accel)
         return cap
     
     # Retry logic
     print(f"Failed to open video source: {source}. Retrying...")
     time.sleep(2.0)
-    cap = cv2.VideoCapture(source_cv, cv2.CAP_FFMPEG)
+    cap = _open_capture(source_cv, hw_accel)
 
     if not cap.isOpened():
         raise IOError(f"Cannot open video source after retry: {source}")
     
     print(f"Successfully opened video source on retry: {source}")
+    _report_hw_accel(cap, hw_accel)
     return cap
 
+def _report_hw_accel(cap, hw_accel):
+    """Logs whether hardware decoding was actually enabled."""
+    if hw_accel:
+        enabled = int(cap.get(cv2.CAP_PROP_HW_ACCELERATION)) != cv2.VIDEO_ACCELERATION_NONE
+        print(f"Hardware video decoding: {'enabled' if enabled else 'unavailable, using CPU'}")
+
 def get_frame_from_source(cap):
     """
     Captures a single valid frame from a video capture object.
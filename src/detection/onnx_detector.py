@@ -0,0 +1,462 @@
+import ast
+import os
+
+import cv2
+import numpy as np
+import onnx
+import onnxruntime as ort
+
+try:
+    import cupy as cp
+except ImportError:
+    cp = None # GPU preprocessing is optional; falls back to the OpenCV path
+
+TRT_CACHE_DIR = 'models/trt_cache'
+LETTERBOX_COLOR = (114, 114, 114)
+
+# Letterbox + bilinear resize + BGR->RGB + /255 + HWC->CHW in one pass.
+# Each thread reads the uint8 source pixels it needs once and writes the
+# three normalized channels straight into the model's input tensor.
+_PREPROCESS_KERNEL_SOURCE = r'''
+#include <cuda_fp16.h>
+
+template<typename T>
+__global__ void letterbox_bgr_to_chw(const unsigned char* src, int src_w, int src_h,
+                                     T* dst, int dst_w, int dst_h,
+                                     int new_w, int new_h, int pad_x, int pad_y,
+                                     float scale_x, float scale_y, float pad_value)
+{
+    int x = blockDim.x * blockIdx.x + threadIdx.x;
+    int y = blockDim.y * blockIdx.y + threadIdx.y;
+    if (x >= dst_w || y >= dst_h) return;
+
+    float b = pad_value, g = pad_value, r = pad_value;
+    int ix = x - pad_x;
+    int iy = y - pad_y;
+    if (ix >= 0 && iy >= 0 && ix < new_w && iy < new_h) {
+        // Half-pixel centers, matching cv2.INTER_LINEAR.
+        float sx = fmaxf((ix + 0.5f) * scale_x - 0.5f, 0.0f);
+        float sy = fmaxf((iy + 0.5f) * scale_y - 0.5f, 0.0f);
+        int x0 = min((int)sx, src_w - 1);
+        int y0 = min((int)sy, src_h - 1);
+        int x1 = min(x0 + 1, src_w - 1);
+        int y1 = min(y0 + 1, src_h - 1);
+        float fx = sx - x0;
+        float fy = sy - y0;
+
+        const unsigned char* p00 = src + (y0 * src_w + x0) * 3;
+        const unsigned char* p01 = src + (y0 * src_w + x1) * 3;
+        const unsigned char* p10 = src + (y1 * src_w + x0) * 3;
+        const unsigned char* p11 = src + (y1 * src_w + x1) * 3;
+        float w00 = (1.0f - fx) * (1.0f - fy);
+        float w01 = fx * (1.0f - fy);
+        float w10 = (1.0f - fx) * fy;
+        float w11 = fx * fy;
+
+        b = p00[0] * w00 + p01[0] * w01 + p10[0] * w10 + p11[0] * w11;
+        g = p00[1] * w00 + p01[1] * w01 + p10[1] * w10 + p11[1] * w11;
+        r = p00[2] * w00 + p01[2] * w01 + p10[2] * w10 + p11[2] * w11;
+    }
+
+    const float norm = 1.0f / 255.0f;
+    int plane = dst_w * dst_h;
+    int o = y * dst_w + x;
+    dst[o] = (T)(r * norm);
+    dst[plane + o] = (T)(g * norm);
+    dst[2 * plane + o] = (T)(b * norm);
+}
+'''
+
+
+def letterbox_geometry(frame_hw, new_shape=(640, 640)):
+    """Returns (ratio, (new_w, new_h), (pad_x, pad_y)) for letterboxing frame_hw into new_shape."""
+    h, w = frame_hw
+    ratio = min(new_shape[0] / h, new_shape[1] / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_x = (new_shape[1] - new_w) // 2
+    pad_y = (new_shape[0] - new_h) // 2
+    return ratio, (new_w, new_h), (pad_x, pad_y)
+
+
+def letterbox(frame, new_shape=(640, 640), color=LETTERBOX_COLOR):
+    """
+    Resizes a frame to fit inside new_shape while keeping its aspect ratio,
+    padding the remainder with a constant border (YOLO-style letterbox).
+
+    Args:
+        frame (numpy.ndarray): The BGR input frame.
+        new_shape (tuple): Target (height, width).
+        color (tuple): Border color.
+
+    Returns:
+        tuple: (padded frame, scale ratio, (pad_x, pad_y))
+    """
+    h, w = frame.shape[:2]
+    ratio, (new_w, new_h), (pad_x, pad_y) = letterbox_geometry((h, w), new_shape)
+
+    if (w, h) != (new_w, new_h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    padded = cv2.copyMakeBorder(frame, pad_y, new_shape[0] - new_h - pad_y,
+                                pad_x, new_shape[1] - new_w - pad_x,
+                                cv2.BORDER_CONSTANT, value=color)
+    return padded, ratio, (pad_x, pad_y)
+
+
+def cv2_cuda_available():
+    """True when OpenCV was built with CUDA support and can see a device."""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0 and hasattr(cv2.cuda, 'createGpuMatFromCudaMemory')
+    except (AttributeError, cv2.error):
+        return False
+
+
+def cuda_major_version():
+    """Major compute capability of GPU 0, or None when neither CuPy nor OpenCV can query it."""
+    try:
+        if cp is not None:
+            return int(cp.cuda.Device(0).compute_capability) // 10
+        if cv2_cuda_available():
+            return cv2.cuda.DeviceInfo(0).majorVersion()
+    except (RuntimeError, cv2.error):
+        pass
+    return None
+
+
+def is_quantized_model(model_path):
+    """True when the graph holds QuantizeLinear/DequantizeLinear nodes, i.e. a QDQ INT8 model."""
+    graph = onnx.load(model_path, load_external_data=False).graph
+    return any(node.op_type in ('QuantizeLinear', 'DequantizeLinear') for node in graph.node)
+
+
+def cuda_provider_available():
+    """True when this ONNX Runtime build ships the CUDA execution provider (onnxruntime-gpu)."""
+    return 'CUDAExecutionProvider' in ort.get_available_providers()
+
+
+def build_providers(device, int8=False, fp16=True, cuda_graph=False):
+    """
+    Returns the ONNX Runtime execution providers to try, best first.
+    TensorRT is preferred on CUDA devices; its compiled engines are cached
+    on disk so only the first run pays the build cost. Engines are cached
+    per precision, so an FP32 engine for GPUs without Tensor Cores never
+    collides with the FP16 one.
+
+    With cuda_graph set, the GPU providers capture the whole inference as a
+    CUDA graph on the first runs and replay it afterwards. This requires
+    every input and output to be bound to the same device address each run.
+    """
+    available = ort.get_available_providers()
+    providers = []
+    if device == 'cuda':
+        if 'TensorrtExecutionProvider' in available:
+            precision = 'int8' if int8 else 'fp16' if fp16 else 'fp32'
+            cache_path = os.path.join(TRT_CACHE_DIR, precision)
+            os.makedirs(cache_path, exist_ok=True)
+            providers.append(('TensorrtExecutionProvider', {
+                'trt_int8_enable': int8,
+                'trt_fp16_enable': fp16,
+                'trt_builder_optimization_level': 5, # Slowest build, fastest kernels; paid once thanks to the cache
+                'trt_engine_cache_enable': True,
+                'trt_engine_cache_path': cache_path,
+                'trt_cuda_graph_enable': cuda_graph,
+            }))
+        if 'CUDAExecutionProvider' in available:
+            providers.append(('CUDAExecutionProvider', {
+                'enable_cuda_graph': cuda_graph,
+                # Benchmarks every cuDNN conv algorithm once per input shape; the
+                # shape is fixed, so only the warmup runs pay for the search
+                'cudnn_conv_algo_search': 'EXHAUSTIVE',
+            }))
+    providers.append('CPUExecutionProvider')
+    return providers
+
+
+class OnnxDetector:
+    """
+    Runs an exported YOLO ONNX model through ONNX Runtime.
+
+    The session, I/O binding and host input buffer are created once and
+    reused for every frame. Decoding and NMS happen here so callers get
+    plain NumPy arrays back, ready to be handed to a tracker.
+    """
+    def __init__(self, model_path, device=None, conf_threshold=0.25, iou_threshold=0.45, classes=None, fp16=None):
+        """
+        device is 'cuda', 'cpu' or None to use CUDA whenever ONNX Runtime can.
+        fp16 allows FP16 TensorRT engines; None enables them unless the GPU is
+        known to predate Tensor Cores (Volta).
+        """
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model file not found: '{model_path}'. Please run 'scripts/export_model.py' first.")
+
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        if device is None:
+            device = 'cuda' if cuda_provider_available() else 'cpu'
+        if fp16 is None:
+            major = cuda_major_version() if device == 'cuda' else None
+            fp16 = major is None or major >= 7
+
+        int8 = is_quantized_model(model_path)
+        self._create_session(model_path, device, int8, fp16)
+        if self.device == 'cuda' and 'CUDAExecutionProvider' not in self.session.get_providers():
+            # The provider is built in but could not load (e.g. missing CUDA or cuDNN libraries)
+            print("Warning: ONNX Runtime could not load the CUDA provider, running on the CPU.")
+            self._create_session(model_path, 'cpu', int8, fp16)
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Exports with a fixed batch > 1 take several frames per run, see infer_batch().
+        self.batch_size = model_input.shape[0] if isinstance(model_input.shape[0], int) else 1
+        self.input_hw = tuple(model_input.shape[2:4])
+        self.input_dtype = np.float16 if model_input.type == 'tensor(float16)' else np.float32
+        model_output = self.session.get_outputs()[0]
+        self.output_name = model_output.name
+        self.output_dtype = np.float16 if model_output.type == 'tensor(float16)' else np.float32
+        self.output_shape = tuple(model_output.shape)
+
+        # Ultralytics stores the class names in the ONNX metadata as a dict literal.
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else {}
+
+        # Boolean class filter, indexed by class id.
+        self.class_mask = np.ones(max(len(self.names), 1), dtype=bool)
+        if classes is not None:
+            self.class_mask[:] = False
+            self.class_mask[list(classes)] = True
+
+        # Letterbox geometry depends only on the frame size, which is fixed per stream.
+        self._frame_hw = None
+        self._geometry = None
+        self._canvas = np.full((*self.input_hw, 3), LETTERBOX_COLOR, dtype=np.uint8)
+        self._resized = None
+
+        self.input_buffer = np.empty((self.batch_size, 3, *self.input_hw), dtype=self.input_dtype)
+        self.output_buffer = None
+        self.io_binding = self.session.io_binding()
+        self.input_value = None
+        self.use_cv2_cuda = False
+        if self.use_cupy:
+            self._init_gpu_buffers()
+            return
+
+        if self.device == 'cuda':
+            self.input_value = ort.OrtValue.ortvalue_from_numpy(self.input_buffer, 'cuda', 0)
+            self.io_binding.bind_ortvalue_input(self.input_name, self.input_value)
+            # Without CuPy, OpenCV's CUDA module can still preprocess on the device
+            self.use_cv2_cuda = self.input_dtype == np.float32 and cv2_cuda_available()
+            if self.use_cv2_cuda:
+                self._init_cv2_cuda_buffers()
+        else:
+            self.io_binding.bind_cpu_input(self.input_name, self.input_buffer)
+        # Results land in the same host array every frame instead of a fresh allocation.
+        self.output_buffer = np.empty(self.output_shape, dtype=self.output_dtype)
+        self.io_binding.bind_output(self.output_name, 'cpu', 0, self.output_dtype,
+                                    list(self.output_shape), self.output_buffer.ctypes.data)
+
+    def _create_session(self, model_path, device, int8, fp16):
+        """Creates the inference session for device and sets the matching GPU flags."""
+        self.device = device
+        self.use_cupy = device == 'cuda' and cp is not None
+
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if device == 'cuda':
+            # The GPU does the work; extra CPU threads would only spin on the launch path.
+            sess_options.intra_op_num_threads = 1
+        # Only the CuPy path keeps both input and output at fixed device addresses,
+        # which is what CUDA graph replay needs.
+        self.cuda_graph = self.use_cupy
+        try:
+            self.session = ort.InferenceSession(
+                model_path, sess_options,
+                providers=build_providers(device, int8=int8, fp16=fp16, cuda_graph=self.cuda_graph))
+        except Exception as e:
+            if not self.cuda_graph:
+                raise
+            # Graph capture is rejected when some nodes fall back to the CPU provider.
+            print(f"Warning: CUDA graph capture unavailable ({e}), running without it.")
+            self.cuda_graph = False
+            self.session = ort.InferenceSession(
+                model_path, sess_options, providers=build_providers(device, int8=int8, fp16=fp16))
+
+    def _init_gpu_buffers(self):
+        """
+        Compiles the fused preprocessing kernel and binds CuPy-owned device
+        buffers as the model input and output.
+        """
+        out_type = '__half' if self.input_dtype == np.float16 else 'float'
+        kernel_name = f'letterbox_bgr_to_chw<{out_type}>'
+        module = cp.RawModule(code=_PREPROCESS_KERNEL_SOURCE, options=('-std=c++11',),
+                              name_expressions=[kernel_name])
+        self._kernel = module.get_function(kernel_name)
+        self._stream = cp.cuda.Stream(non_blocking=True)
+        self._gpu_input = cp.empty((self.batch_size, 3, *self.input_hw), dtype=self.input_dtype)
+        self._gpu_frame = None
+        self._pinned_frame = None
+        self.io_binding.bind_input(self.input_name, 'cuda', 0, self.input_dtype,
+                                   list(self._gpu_input.shape), self._gpu_input.data.ptr)
+
+        self._gpu_output = cp.empty(self.output_shape, dtype=self.output_dtype)
+        self._gpu_class_mask = cp.asarray(self.class_mask)
+        self.io_binding.bind_output(self.output_name, 'cuda', 0, self.output_dtype,
+                                    list(self._gpu_output.shape), self._gpu_output.data.ptr)
+
+    def _init_cv2_cuda_buffers(self):
+        """
+        Wraps each channel plane of the bound ONNX Runtime input tensor in a
+        GpuMat, so OpenCV's CUDA ops write the model input in place.
+        """
+        h, w = self.input_hw
+        plane_bytes = h * w * np.dtype(np.float32).itemsize
+        ptr = self.input_value.data_ptr()
+        self._cv_planes = [[cv2.cuda.createGpuMatFromCudaMemory(h, w, cv2.CV_32FC1, ptr + (b * 3 + c) * plane_bytes)
+                            for c in range(3)] for b in range(self.batch_size)]
+        self._cv_frame = cv2.cuda_GpuMat()
+        self._cv_resized = cv2.cuda_GpuMat()
+        self._cv_padded = cv2.cuda_GpuMat()
+
+    def _update_geometry(self, frame):
+        """Recomputes cached letterbox geometry and buffers when the frame size changes."""
+        frame_hw = frame.shape[:2]
+        if frame_hw == self._frame_hw:
+            return
+        self._frame_hw = frame_hw
+        self._geometry = letterbox_geometry(frame_hw, self.input_hw)
+        _, (new_w, new_h), _ = self._geometry
+        self._resized = np.empty((new_h, new_w, 3), dtype=np.uint8)
+        # The previous size (or the warmup frames) may have drawn over the new padding
+        self._canvas[:] = LETTERBOX_COLOR
+        if self.use_cupy:
+            # Page-locked staging buffer so the upload can run asynchronously.
+            pinned = cp.cuda.alloc_pinned_memory(frame.nbytes)
+            self._pinned_frame = np.frombuffer(pinned, dtype=np.uint8, count=frame.size).reshape(frame.shape)
+            self._gpu_frame = cp.empty(frame.shape, dtype=np.uint8)
+
+    def preprocess(self, frame, index=0):
+        """Letterboxes a BGR frame into slot index of the CHW RGB model input."""
+        self._update_geometry(frame)
+        ratio, (new_w, new_h), (pad_x, pad_y) = self._geometry
+
+        if self.use_cupy:
+            np.copyto(self._pinned_frame, frame)
+            dst_h, dst_w = self.input_hw
+            with self._stream:
+                self._gpu_frame.set(self._pinned_frame, stream=self._stream)
+                self._kernel(((dst_w + 15) // 16, (dst_h + 15) // 16), (16, 16),
+                             (self._gpu_frame, np.int32(frame.shape[1]), np.int32(frame.shape[0]),
+                              self._gpu_input[index], np.int32(dst_w), np.int32(dst_h),
+                              np.int32(new_w), np.int32(new_h), np.int32(pad_x), np.int32(pad_y),
+                              np.float32(frame.shape[1] / new_w), np.float32(frame.shape[0] / new_h),
+                              np.float32(LETTERBOX_COLOR[0])))
+            # ONNX Runtime runs on its own stream, so the input must be ready first.
+            self._stream.synchronize()
+        elif self.use_cv2_cuda:
+            # Calls on OpenCV's default stream complete before returning, so the
+            # input is ready by the time ONNX Runtime runs.
+            self._cv_frame.upload(frame)
+            resized = self._cv_frame
+            if (new_w, new_h) != (frame.shape[1], frame.shape[0]):
+                resized = cv2.cuda.resize(self._cv_frame, (new_w, new_h), dst=self._cv_resized,
+                                          interpolation=cv2.INTER_LINEAR)
+            dst_h, dst_w = self.input_hw
+            padded = cv2.cuda.copyMakeBorder(resized, pad_y, dst_h - new_h - pad_y, pad_x, dst_w - new_w - pad_x,
+                                             cv2.BORDER_CONSTANT, dst=self._cv_padded, value=LETTERBOX_COLOR)
+            # Planes come out in BGR order; writing them in reverse gives the RGB input
+            for plane, dst in zip(cv2.cuda.split(padded), reversed(self._cv_planes[index])):
+                plane.convertTo(cv2.CV_32F, dst=dst, alpha=1 / 255.0)
+        else:
+            # Resize into a preallocated buffer, then let blobFromImage do the
+            # channel swap, scaling and HWC->CHW transpose in a single pass.
+            cv2.resize(frame, (new_w, new_h), dst=self._resized, interpolation=cv2.INTER_LINEAR)
+            self._canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = self._resized
+            blob = cv2.dnn.blobFromImage(self._canvas, scalefactor=1 / 255.0, swapRB=True)
+            np.copyto(self.input_buffer[index], blob[0], casting='unsafe')
+        return ratio, (pad_x, pad_y)
+
+    def select_candidates(self, output, index=0):
+        """
+        Applies the confidence and class filters to one image of the raw
+        (B, 4 + num_classes, N) YOLO output. Returns a packed (K, 6) array of
+        [cx, cy, w, h, conf, cls].
+        """
+        preds = output[index]
+        scores = preds[4:]
+        cls = scores.argmax(axis=0)
+        conf = scores.max(axis=0)
+        keep = (conf >= self.conf_threshold) & self.class_mask[cls]
+        return np.concatenate([preds[:4, keep], conf[None, keep], cls[None, keep]], axis=0).T.astype(np.float32)
+
+    def _select_candidates_gpu(self, index=0):
+        """
+        Filters the output while it is still on the device and brings the
+        survivors back in one packed copy, instead of downloading every anchor.
+        """
+        preds = self._gpu_output[index].astype(cp.float32)
+        scores = preds[4:]
+        cls = scores.argmax(axis=0)
+        conf = scores.max(axis=0)
+        keep = (conf >= self.conf_threshold) & self._gpu_class_mask[cls]
+        packed = cp.concatenate([preds[:4, keep], conf[None, keep], cls[None, keep].astype(cp.float32)], axis=0)
+        return cp.asnumpy(packed.T)
+
+    def postprocess(self, candidates, ratio, pad, frame_shape):
+        """
+        Decodes packed [cx, cy, w, h, conf, cls] candidates into (xyxy, conf, cls)
+        arrays in original frame coordinates, after non-maximum suppression.
+        """
+        if len(candidates) == 0:
+            return np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, np.int32)
+
+        cxcywh = candidates[:, :4]
+        conf = candidates[:, 4]
+        cls = candidates[:, 5].astype(np.int32)
+
+        xyxy = np.empty_like(cxcywh)
+        xyxy[:, :2] = cxcywh[:, :2] - cxcywh[:, 2:] / 2
+        xyxy[:, 2:] = cxcywh[:, :2] + cxcywh[:, 2:] / 2
+        xyxy[:, [0, 2]] -= pad[0]
+        xyxy[:, [1, 3]] -= pad[1]
+        xyxy /= ratio
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, frame_shape[1])
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, frame_shape[0])
+
+        # Class-aware NMS, matching Ultralytics' default (non-agnostic) behaviour.
+        xywh = np.concatenate([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]], axis=1)
+        indices = cv2.dnn.NMSBoxesBatched(xywh.tolist(), conf.tolist(), cls.tolist(),
+                                          self.conf_threshold, self.iou_threshold)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        return xyxy[indices], conf[indices], cls[indices]
+
+    def infer_batch(self, frames):
+        """
+        Runs detection on up to batch_size BGR frames in a single model run.
+        Returns one (xyxy, conf, cls) tuple per frame, in order. Unused batch
+        slots keep stale data and their outputs are ignored.
+        """
+        geometry = [self.preprocess(frame, index) for index, frame in enumerate(frames)]
+        if self.input_value is not None and not self.use_cv2_cuda:
+            self.input_value.update_inplace(self.input_buffer)
+        self.session.run_with_iobinding(self.io_binding)
+
+        results = []
+        for index, (frame, (ratio, pad)) in enumerate(zip(frames, geometry)):
+            if self.use_cupy:
+                candidates = self._select_candidates_gpu(index)
+            else:
+                candidates = self.select_candidates(self.output_buffer, index)
+            results.append(self.postprocess(candidates, ratio, pad, frame.shape))
+        return results
+
+    def infer(self, frame):
+        """Runs detection on a single BGR frame."""
+        return self.infer_batch([frame])[0]
+
+    def warmup(self, runs=3):
+        """
+        Runs a few full batches of blank frames so cuDNN algorithm search,
+        TensorRT engine builds and CUDA graph capture happen before the first
+        real frame rather than stalling it.
+        """
+        frames = [np.zeros((*self.input_hw, 3), dtype=np.uint8)] * self.batch_size
+        for _ in range(runs):
+            self.infer_batch(frames)
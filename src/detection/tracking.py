@@ -0,0 +1,249 @@
+from types import SimpleNamespace
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+# Mirrors the defaults shipped in Ultralytics' bytetrack.yaml.
+BYTETRACK_ARGS = SimpleNamespace(
+    track_high_thresh=0.25,
+    track_low_thresh=0.1,
+    new_track_thresh=0.25,
+    track_buffer=30,
+    match_thresh=0.8,
+    fuse_score=True,
+)
+
+TRACKED = 1
+LOST = 2
+
+# Constant-velocity Kalman filter over (cx, cy, aspect, height) and their velocities.
+_STD_WEIGHT_POSITION = 1.0 / 20
+_STD_WEIGHT_VELOCITY = 1.0 / 160
+_MOTION = np.eye(8)
+_MOTION[:4, 4:] = np.eye(4)
+
+
+def _xyxy_to_xyah(xyxy):
+    """Converts (N, 4) xyxy boxes to (center x, center y, aspect ratio w/h, height)."""
+    wh = xyxy[:, 2:] - xyxy[:, :2]
+    return np.column_stack([(xyxy[:, :2] + xyxy[:, 2:]) / 2, wh[:, 0] / wh[:, 1], wh[:, 1]])
+
+
+def _xyah_to_xyxy(xyah):
+    """Converts (N, 4) (center x, center y, aspect ratio, height) boxes to xyxy."""
+    half_wh = np.column_stack([xyah[:, 2] * xyah[:, 3], xyah[:, 3]]) / 2
+    return np.concatenate([xyah[:, :2] - half_wh, xyah[:, :2] + half_wh], axis=1)
+
+
+def _diag(std):
+    """Stacks (N, D) standard deviations into (N, D, D) diagonal covariances."""
+    cov = np.zeros((*std.shape, std.shape[1]))
+    idx = np.arange(std.shape[1])
+    cov[:, idx, idx] = std ** 2
+    return cov
+
+
+def _kf_initiate(measurement):
+    """Creates track state from unassociated (N, 4) xyah measurements."""
+    h = measurement[:, 3]
+    mean = np.concatenate([measurement, np.zeros_like(measurement)], axis=1)
+    std = np.column_stack([
+        2 * _STD_WEIGHT_POSITION * h, 2 * _STD_WEIGHT_POSITION * h, np.full_like(h, 1e-2), 2 * _STD_WEIGHT_POSITION * h,
+        10 * _STD_WEIGHT_VELOCITY * h, 10 * _STD_WEIGHT_VELOCITY * h, np.full_like(h, 1e-5), 10 * _STD_WEIGHT_VELOCITY * h,
+    ])
+    return mean, _diag(std)
+
+
+def _kf_predict(mean, cov):
+    """Runs the prediction step for all (N, 8) states at once."""
+    h = mean[:, 3]
+    std = np.column_stack([
+        _STD_WEIGHT_POSITION * h, _STD_WEIGHT_POSITION * h, np.full_like(h, 1e-2), _STD_WEIGHT_POSITION * h,
+        _STD_WEIGHT_VELOCITY * h, _STD_WEIGHT_VELOCITY * h, np.full_like(h, 1e-5), _STD_WEIGHT_VELOCITY * h,
+    ])
+    return mean @ _MOTION.T, _MOTION @ cov @ _MOTION.T + _diag(std)
+
+
+def _kf_update(mean, cov, measurement):
+    """Runs the correction step for all (N, 8) states against their (N, 4) measurements."""
+    h = mean[:, 3]
+    std = np.column_stack([_STD_WEIGHT_POSITION * h, _STD_WEIGHT_POSITION * h,
+                           np.full_like(h, 1e-1), _STD_WEIGHT_POSITION * h])
+    innovation_cov = cov[:, :4, :4] + _diag(std)
+    # Kalman gain K = P H^T S^-1, solved as K^T = S^-1 (H P) since S and P are symmetric.
+    gain_t = np.linalg.solve(innovation_cov, cov[:, :4, :])
+    gain = gain_t.transpose(0, 2, 1)
+    innovation = measurement - mean[:, :4]
+    new_mean = mean + np.einsum('nij,nj->ni', gain, innovation)
+    new_cov = cov - gain @ innovation_cov @ gain_t
+    return new_mean, new_cov
+
+
+def _iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-7)
+
+
+def _linear_assignment(cost, thresh):
+    """
+    Solves the assignment problem, keeping only pairs with cost <= thresh.
+
+    Returns:
+        tuple: ((K, 2) matched row/col pairs, unmatched rows, unmatched cols)
+    """
+    rows, cols = linear_sum_assignment(cost) if cost.size else (np.empty(0, np.intp), np.empty(0, np.intp))
+    keep = cost[rows, cols] <= thresh
+    rows, cols = rows[keep], cols[keep]
+    unmatched_rows = np.setdiff1d(np.arange(cost.shape[0]), rows)
+    unmatched_cols = np.setdiff1d(np.arange(cost.shape[1]), cols)
+    return np.column_stack([rows, cols]), unmatched_rows, unmatched_cols
+
+
+class ByteTrackTracker:
+    """
+    ByteTrack over NumPy arrays, independent of Ultralytics' tracker classes.
+
+    Every track is one row across a set of state arrays, so Kalman
+    prediction/correction and IoU matching run as batched array operations
+    rather than a Python loop over per-track objects.
+    """
+    def __init__(self, frame_rate=30, args=BYTETRACK_ARGS):
+        self.args = args
+        self.max_time_lost = int(frame_rate / 30.0 * args.track_buffer)
+        self.frame_id = 0
+        self.next_id = 1
+
+        self.mean = np.empty((0, 8))
+        self.cov = np.empty((0, 8, 8))
+        self.ids = np.empty(0, np.int32)
+        self.score = np.empty(0, np.float32)
+        self.cls = np.empty(0, np.int32)
+        self.state = np.empty(0, np.int8)
+        self.activated = np.empty(0, bool)
+        self.last_frame = np.empty(0, np.int64)
+        self.start_frame = np.empty(0, np.int64)
+
+    def _apply_matches(self, matches, track_rows, det_rows, xyxy, conf, cls):
+        """Corrects matched tracks with their detections and marks them tracked."""
+        if len(matches) == 0:
+            return
+        tracks = track_rows[matches[:, 0]]
+        dets = det_rows[matches[:, 1]]
+        self.mean[tracks], self.cov[tracks] = _kf_update(self.mean[tracks], self.cov[tracks], _xyxy_to_xyah(xyxy[dets]))
+        self.state[tracks] = TRACKED
+        self.activated[tracks] = True
+        self.score[tracks] = conf[dets]
+        self.cls[tracks] = cls[dets]
+        self.last_frame[tracks] = self.frame_id
+
+    def _add_tracks(self, xyxy, conf, cls):
+        """Starts new tracks; they are only reported once confirmed on a later frame."""
+        count = len(conf)
+        mean, cov = _kf_initiate(_xyxy_to_xyah(xyxy))
+        self.mean = np.concatenate([self.mean, mean])
+        self.cov = np.concatenate([self.cov, cov])
+        self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + count, dtype=np.int32)])
+        self.next_id += count
+        self.score = np.concatenate([self.score, conf])
+        self.cls = np.concatenate([self.cls, cls])
+        self.state = np.concatenate([self.state, np.full(count, TRACKED, np.int8)])
+        self.activated = np.concatenate([self.activated, np.full(count, self.frame_id == 1)])
+        self.last_frame = np.concatenate([self.last_frame, np.full(count, self.frame_id, np.int64)])
+        self.start_frame = np.concatenate([self.start_frame, np.full(count, self.frame_id, np.int64)])
+
+    def _keep(self, keep):
+        """Drops every track row where keep is False."""
+        for name in ('mean', 'cov', 'ids', 'score', 'cls', 'state', 'activated', 'last_frame', 'start_frame'):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def _duplicates(self, removed):
+        """Flags tracked/lost pairs that overlap almost entirely, keeping the longer-lived one."""
+        tracked = np.flatnonzero((self.state == TRACKED) & ~removed)
+        lost = np.flatnonzero((self.state == LOST) & ~removed)
+        duplicate = np.zeros(len(self.ids), dtype=bool)
+        if len(tracked) == 0 or len(lost) == 0:
+            return duplicate
+        boxes = _xyah_to_xyxy(self.mean[:, :4])
+        pairs = np.argwhere(1 - _iou(boxes[tracked], boxes[lost]) < 0.15)
+        t, l = tracked[pairs[:, 0]], lost[pairs[:, 1]]
+        tracked_older = (self.last_frame[t] - self.start_frame[t]) > (self.last_frame[l] - self.start_frame[l])
+        duplicate[l[tracked_older]] = True
+        duplicate[t[~tracked_older]] = True
+        return duplicate
+
+    def update(self, xyxy, conf, cls):
+        """
+        Associates the current frame's detections with existing tracks.
+
+        Returns:
+            tuple: (xyxy, track_ids, cls, conf) arrays for the active tracks.
+        """
+        args = self.args
+        self.frame_id += 1
+        xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+        conf = np.asarray(conf, dtype=np.float32)
+        cls = np.asarray(cls, dtype=np.int32)
+
+        wh = xyxy[:, 2:] - xyxy[:, :2]
+        valid = (wh[:, 0] > 0) & (wh[:, 1] > 0)
+        high = np.flatnonzero(valid & (conf >= args.track_high_thresh))
+        low = np.flatnonzero(valid & (conf > args.track_low_thresh) & (conf < args.track_high_thresh))
+
+        tracked = self.state == TRACKED
+        pool = np.flatnonzero((tracked & self.activated) | (self.state == LOST))
+        unconfirmed = np.flatnonzero(tracked & ~self.activated)
+
+        # Predict every pooled track in one batch; lost tracks stop changing height.
+        if len(pool):
+            mean = self.mean[pool]
+            mean[self.state[pool] != TRACKED, 7] = 0
+            self.mean[pool], self.cov[pool] = _kf_predict(mean, self.cov[pool])
+        track_boxes = _xyah_to_xyxy(self.mean[:, :4])
+
+        # 1. Confident detections against tracked and lost tracks
+        cost = 1 - _iou(track_boxes[pool], xyxy[high])
+        if args.fuse_score:
+            cost = 1 - (1 - cost) * conf[high][None, :]
+        matches, unmatched_pool, unmatched_high = _linear_assignment(cost, args.match_thresh)
+        self._apply_matches(matches, pool, high, xyxy, conf, cls)
+
+        # 2. Still-unmatched tracked tracks against low-confidence detections
+        remaining = pool[unmatched_pool]
+        remaining = remaining[self.state[remaining] == TRACKED]
+        cost = 1 - _iou(track_boxes[remaining], xyxy[low])
+        matches, unmatched_remaining, _ = _linear_assignment(cost, 0.5)
+        self._apply_matches(matches, remaining, low, xyxy, conf, cls)
+        self.state[remaining[unmatched_remaining]] = LOST
+
+        # 3. Unconfirmed tracks (seen once) against the leftover confident detections
+        high = high[unmatched_high]
+        cost = 1 - _iou(track_boxes[unconfirmed], xyxy[high])
+        if args.fuse_score:
+            cost = 1 - (1 - cost) * conf[high][None, :]
+        matches, unmatched_unconfirmed, unmatched_high = _linear_assignment(cost, 0.7)
+        self._apply_matches(matches, unconfirmed, high, xyxy, conf, cls)
+
+        removed = np.zeros(len(self.ids), dtype=bool)
+        removed[unconfirmed[unmatched_unconfirmed]] = True
+        removed |= (self.state == LOST) & (self.frame_id - self.last_frame > self.max_time_lost)
+
+        # 4. Start tracks for confident detections nothing claimed
+        new = high[unmatched_high]
+        new = new[conf[new] >= args.new_track_thresh]
+        if len(new):
+            self._add_tracks(xyxy[new], conf[new], cls[new])
+            removed = np.concatenate([removed, np.zeros(len(new), dtype=bool)])
+
+        removed |= self._duplicates(removed)
+        self._keep(~removed)
+
+        active = (self.state == TRACKED) & self.activated
+        return (_xyah_to_xyxy(self.mean[active, :4]).astype(np.float32), self.ids[active],
+                self.cls[active], self.score[active])
@@ -0,0 +1,127 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None # Numba is optional; falls back to the vectorized NumPy update
+
+NOT_TIMED = -1
+
+
+def _update_zone_timers_numpy(boxes, class_ids, track_ids, zone_map, origin_x, origin_y, class_mask,
+                              enter_ns, last_seen_ns, now_ns, zone_indices, elapsed_ns):
+    """Vectorized fallback with the same contract as the compiled kernel."""
+    h, w = zone_map.shape
+    x = (boxes[:, 0] + boxes[:, 2]) // 2 - origin_x
+    y = (boxes[:, 1] + boxes[:, 3]) // 2 - origin_y
+    inside = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+    zone_indices[:] = -1
+    zone_indices[inside] = zone_map[y[inside], x[inside]].astype(np.intp) - 1
+
+    violating = (zone_indices >= 0) & class_mask[class_ids]
+    ids = track_ids[violating]
+    entering = ids[enter_ns[ids] == NOT_TIMED]
+    enter_ns[entering] = now_ns
+    last_seen_ns[ids] = now_ns
+    elapsed_ns[:] = NOT_TIMED
+    elapsed_ns[violating] = now_ns - enter_ns[ids]
+
+
+def _update_zone_timers_loop(boxes, class_ids, track_ids, zone_map, origin_x, origin_y, class_mask,
+                             enter_ns, last_seen_ns, now_ns, zone_indices, elapsed_ns):
+    """Single pass over the detections: zone lookup, class check and timer update."""
+    h, w = zone_map.shape
+    for i in range(boxes.shape[0]):
+        x = (boxes[i, 0] + boxes[i, 2]) // 2 - origin_x
+        y = (boxes[i, 1] + boxes[i, 3]) // 2 - origin_y
+        if x < 0 or y < 0 or x >= w or y >= h:
+            zone = -1 # Outside the zones' bounding box
+        else:
+            zone = np.intp(zone_map[y, x]) - 1
+        zone_indices[i] = zone
+        if zone < 0 or not class_mask[class_ids[i]]:
+            elapsed_ns[i] = NOT_TIMED
+            continue
+        track_id = track_ids[i]
+        if enter_ns[track_id] == NOT_TIMED:
+            enter_ns[track_id] = now_ns # Vehicle just entered the zone
+        last_seen_ns[track_id] = now_ns
+        elapsed_ns[i] = now_ns - enter_ns[track_id]
+
+
+update_zone_timers = njit(cache=True)(_update_zone_timers_loop) if njit is not None else _update_zone_timers_numpy
+
+
+class ZoneTimers:
+    """
+    Per-track zone timers stored in flat arrays indexed by track id, so the
+    whole per-frame update runs as one compiled (or vectorized) pass with
+    no per-detection dict work. Track ids are small, increasing integers,
+    and the arrays grow as needed.
+
+    The ids of running timers are also kept in a compact array, so expiry
+    only looks at tracks that are actually timed. A vehicle parked for hours
+    does not make the sweep cover every id issued since it arrived.
+    """
+    def __init__(self, capacity=65536):
+        self.enter_ns = np.full(capacity, NOT_TIMED, dtype=np.int64)
+        self.last_seen_ns = np.full(capacity, NOT_TIMED, dtype=np.int64)
+        self.timed_ids = np.empty(0, dtype=np.int64) # Ids whose timer is running
+        self._warmup()
+
+    def _warmup(self):
+        """Compiles the kernel at startup rather than on the first detection."""
+        self.update(np.zeros((1, 4), np.int32), np.zeros(1, np.int32), np.zeros(1, np.int32),
+                    np.zeros((1, 1), np.uint8), (0, 0), np.zeros(1, bool), 0)
+
+    def _grow(self, max_id):
+        """Resizes the timer arrays so max_id is a valid index."""
+        capacity = len(self.enter_ns)
+        while capacity <= max_id:
+            capacity *= 2
+        pad = capacity - len(self.enter_ns)
+        self.enter_ns = np.concatenate([self.enter_ns, np.full(pad, NOT_TIMED, dtype=np.int64)])
+        self.last_seen_ns = np.concatenate([self.last_seen_ns, np.full(pad, NOT_TIMED, dtype=np.int64)])
+
+    def update(self, boxes, class_ids, track_ids, zone_map, zone_origin, class_mask, now_ns):
+        """
+        Looks up the zone under each box center and advances the timers of
+        tracks whose class violates inside a zone.
+
+        Args:
+            boxes (numpy.ndarray): (N, 4) int32 xyxy boxes.
+            class_ids (numpy.ndarray): (N,) int32 class ids.
+            track_ids (numpy.ndarray): (N,) int32 track ids.
+            zone_map (numpy.ndarray): uint8 image of (zone index + 1), 0 outside zones.
+            zone_origin (tuple): Frame (x, y) of the zone map's top-left pixel.
+            class_mask (numpy.ndarray): Boolean array, True for violating class ids.
+            now_ns (int): Current time.monotonic_ns() reading.
+
+        Returns:
+            tuple: (zone index or -1, elapsed ns in zone or -1 if not violating) per detection.
+        """
+        if len(track_ids):
+            max_id = int(track_ids.max())
+            if max_id >= len(self.enter_ns):
+                self._grow(max_id)
+        was_timed = self.enter_ns[track_ids] != NOT_TIMED
+        zone_indices = np.empty(len(track_ids), dtype=np.intp)
+        elapsed_ns = np.empty(len(track_ids), dtype=np.int64)
+        update_zone_timers(boxes, class_ids, track_ids, zone_map, np.int32(zone_origin[0]), np.int32(zone_origin[1]),
+                           class_mask, self.enter_ns, self.last_seen_ns, np.int64(now_ns), zone_indices, elapsed_ns)
+        entered = track_ids[(elapsed_ns != NOT_TIMED) & ~was_timed]
+        if len(entered):
+            self.timed_ids = np.concatenate([self.timed_ids, entered])
+        return zone_indices, elapsed_ns
+
+    def expire(self, now_ns, grace_ns):
+        """
+        Stops the timers of tracks that have not been seen inside a zone for
+        longer than grace_ns, and returns their ids.
+        """
+        stale = self.last_seen_ns[self.timed_ids] + grace_ns < now_ns
+        expired = self.timed_ids[stale]
+        self.enter_ns[expired] = NOT_TIMED
+        self.last_seen_ns[expired] = NOT_TIMED
+        self.timed_ids = self.timed_ids[~stale]
+        return expired
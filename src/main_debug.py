@@ -1,35 +1,49 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import json
 import time
 import os
-import torch
 import sys
 import threading
 import queue
-import requests
+import signal
 
 # Add project root to the Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from capture.stream_handler import get_video_capture
+from detection.onnx_detector import OnnxDetector
+from detection.tracking import ByteTrackTracker
+from detection.zone_timers import ZoneTimers
+from reporting.dashboard_client import DashboardClient
+from reporting.snapshot_writer import SnapshotWriter
 
 # --- Configuration ---
 SETTINGS_FILE = 'config/settings.json'
 ZONES_FILE = 'config/zones.json'
-MODEL_PATH = 'models/yolo11m.pt'
+MODEL_PATH = 'models/yolo11m.onnx' # Produced by scripts/export_model.py; use yolo11m.fp16.onnx on GPUs without TensorRT
+INT8_MODEL_PATH = 'models/yolo11m.int8.onnx' # Preferred when the export's INT8 model passed its accuracy check
+TARGET_CLASSES = [2, 3] # 2 car, 3 motorcycle, 0 is motorcycle in custom model
+VIOLATION_CLASSES = {'motorcycle'} # Class labels that violate when parked in a zone
 CONF_THRESHOLD = 0.3
 IOU_THRESHOLD = 0.5
 VIOLATION_THRESHOLD_SECONDS = 10
 TRACK_GRACE_PERIOD_SECONDS = 3  # How long to wait before considering a track lost
+# Timers run on integer time.monotonic_ns() readings
+VIOLATION_THRESHOLD_NS = VIOLATION_THRESHOLD_SECONDS * 1_000_000_000
+TRACK_GRACE_PERIOD_NS = TRACK_GRACE_PERIOD_SECONDS * 1_000_000_000
 SNAPSHOT_DIR = 'output/snapshots'
 LOG_DIR = 'output/logs'
-DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+DEVICE = None # 'cuda' or 'cpu' to force one; None runs on CUDA whenever ONNX Runtime provides it
 DASHBOARD_URL = "http://localhost:8080/violation"
+DETECTION_QUEUE_SIZE = 2 # Detection results buffered between the inference thread and the main loop
+DETECT_EVERY_N_FRAMES = 3 # Run the model on every Nth frame; frames in between reuse the last detections
 
 ### --- ADDED FOR DEBUG DISPLAY --- ###
+DISPLAY_ENABLED = os.environ.get("PV_DISPLAY", "0") == "1" # Set PV_DISPLAY=1 to open the debug window
 DISPLAY_WIDTH = 1280 # Width for the debug window display
+DISPLAY_EVERY_N_FRAMES = 2 # Refresh the debug window every Nth processed frame
+WINDOW_NAME = 'Real-time Parking Violation Detection'
 
 # --- Setup ---
 os.makedirs(SNAPSHOT_DIR, exist_ok=True)
@@ -38,9 +52,10 @@ os.makedirs(LOG_DIR, exist_ok=True)
 # --- (Pysource) Threaded Video Stream ---
 class VideoStream:
     """A threaded video stream reader to prevent I/O blocking."""
-    def __init__(self, src=0):
+    def __init__(self, src=0, ring_slots=2):
         self.source = src
-        self.cap = get_video_capture(src)
+        self.ring_slots = ring_slots
+        self.cap = get_video_capture(src, hw_accel=True)
         self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Keep buffer small
         self.is_file_source = isinstance(src, str) and os.path.exists(src)
         self.source_fps = self._determine_source_fps()
@@ -49,7 +64,18 @@ class VideoStream:
         else:
             self.frame_interval = None
         
-        self.queue = queue.Queue(maxsize=1)
+        # Single-slot handoff: the producer publishes the newest frame into
+        # _slot, and only decodes one when the consumer has taken the last.
+        # Frames are decoded straight into a preallocated ring, written round
+        # robin. ring_slots must exceed the number of frames the consumer side
+        # can hold at once, so the slot being written is never one in use.
+        self._slot = None
+        self._lock = threading.Lock() # Guards _slot together with the two events
+        self._ring = None
+        self._write_idx = 0
+        self._frame_ready = threading.Event()
+        self._consumer_ready = threading.Event()
+        self._consumer_ready.set()
         self.running = True
         self.thread = threading.Thread(target=self._run, daemon=True)
         self.thread.start()
@@ -64,51 +90,231 @@ class VideoStream:
             return 30.0
         return 0.0
 
+    def _allocate_ring(self, frame):
+        """(Re)allocates the frame ring for frames shaped like the given one."""
+        # Plain arrays rather than one shared mapping: frames of the previous
+        # ring still held downstream (worker queue, main loop) keep their own
+        # slot alive until they are dropped.
+        self._ring = [np.empty(frame.shape, dtype=frame.dtype) for _ in range(self.ring_slots)]
+        self._write_idx = 0
+
     def _run(self):
         """Internal thread target function."""
         print("Video stream thread started...")
+        pace_anchor = None # (perf_counter, stream position in seconds) of the first paced frame
+        frame_index = 0
         while self.running:
-            iteration_start = time.time()
-            ret, frame = self.cap.read()
+            # Always grab to stay on the newest frame, but skip the decode/convert
+            # in retrieve() while the detector is still busy with the last one.
+            ret = self.cap.grab()
+            frame = None
+            if ret and self._consumer_ready.is_set():
+                if self._ring is not None:
+                    target = self._ring[self._write_idx]
+                    ret, frame = self.cap.retrieve(target)
+                else:
+                    target = None
+                    ret, frame = self.cap.retrieve()
+                if ret and frame is not target:
+                    # First frame, or the source changed resolution: move to a ring that fits.
+                    self._allocate_ring(frame)
+                    np.copyto(self._ring[0], frame)
+                    frame = self._ring[0]
             if not ret:
                 print("Stream thread: No frame returned, retrying...")
                 self.cap.release()
                 time.sleep(1)
-                self.cap = get_video_capture(self.source) # Reconnect
+                self.cap = get_video_capture(self.source, hw_accel=True) # Reconnect
                 self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
                 self.source_fps = self._determine_source_fps()
                 if self.is_file_source and self.source_fps:
                     self.frame_interval = 1.0 / self.source_fps
                 else:
                     self.frame_interval = None
+                pace_anchor = None
+                frame_index = 0
                 continue
 
-            if not self.queue.empty():
-                try:
-                    self.queue.get_nowait()  # Discard old frame
-                except queue.Empty:
-                    pass
-            self.queue.put(frame)
+            if frame is not None:
+                with self._lock:
+                    self._consumer_ready.clear()
+                    self._slot = frame
+                    self._frame_ready.set()
+                self._write_idx = (self._write_idx + 1) % self.ring_slots
 
             if self.frame_interval:
-                elapsed = time.time() - iteration_start
-                sleep_time = self.frame_interval - elapsed
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+                # Pace file playback on the stream's own timestamps against a
+                # monotonic anchor, so sleep error does not accumulate.
+                frame_index += 1
+                position_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+                position = position_ms / 1000.0 if position_ms > 0 else frame_index * self.frame_interval
+                now = time.perf_counter()
+                if pace_anchor is None or position < pace_anchor[1]:
+                    pace_anchor = (now, position) # First frame, or the file looped
+                else:
+                    sleep_time = pace_anchor[0] + (position - pace_anchor[1]) - now
+                    if sleep_time > 0:
+                        time.sleep(sleep_time)
     
-    def read(self):
-        """Read the latest frame from the queue."""
-        if self.queue.empty():
+    def read(self, timeout=0.0):
+        """
+        Read the latest frame, waiting up to timeout seconds for one to
+        arrive, or None if none did. The frame is a slot of the frame
+        ring and stays valid until ring_slots - 1 further frames have been read.
+        """
+        if not self._frame_ready.wait(timeout):
             return None # No frame available yet
-        return self.queue.get_nowait()
+        with self._lock:
+            frame = self._slot
+            self._slot = None
+            self._frame_ready.clear()
+            self._consumer_ready.set()
+        return frame
 
     def stop(self):
         """Stop the thread and release resources."""
         self.running = False
         self.thread.join()
         self.cap.release()
+        self._slot = None
+        self._ring = None
         print("Video stream thread stopped.")
 
+# --- Pipelined Detection ---
+class DetectionWorker:
+    """
+    Runs the detector on its own thread, so inference on the next frame
+    overlaps tracking, drawing and display of the current one. Results are
+    handed over in order through a small bounded queue.
+
+    When the model was exported with a batch size above one, the worker
+    gathers that many consecutive frames and runs them through the model
+    at once, trading a few frames of latency for throughput.
+
+    Only every detect_every-th frame goes through the model. The frames in
+    between carry the most recent detections forward, which holds up well
+    for parked vehicles, and the tracker and zone timers still see every
+    frame.
+    """
+    def __init__(self, stream, detector, max_pending=DETECTION_QUEUE_SIZE, detect_every=DETECT_EVERY_N_FRAMES):
+        self.stream = stream
+        self.detector = detector
+        self.detect_every = max(int(detect_every), 1)
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _put(self, frame, detections):
+        """Queues one frame's result, waiting for room unless the worker is stopping."""
+        while self.running:
+            try:
+                self.queue.put((frame, detections), timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _run(self):
+        """Internal thread target function."""
+        try:
+            batch = []
+            pending = [] # Frames waiting on the current batch, in order: (frame, batch index or None)
+            last_detections = None
+            frame_index = 0
+            while self.running:
+                frame = self.stream.read(timeout=0.1) # Woken as soon as a frame is published
+                if frame is None:
+                    continue
+                run_model = frame_index % self.detect_every == 0
+                frame_index += 1
+                if not run_model:
+                    if batch:
+                        pending.append((frame, None)) # Must follow the batch's earlier frames
+                    else:
+                        self._put(frame, last_detections)
+                    continue
+
+                pending.append((frame, len(batch)))
+                batch.append(frame)
+                if len(batch) < self.detector.batch_size:
+                    continue
+                # Tracking stays per frame, so results are queued one frame at a time
+                results = self.detector.infer_batch(batch)
+                for frame, index in pending:
+                    if index is not None:
+                        last_detections = results[index]
+                    self._put(frame, last_detections)
+                batch = []
+                pending = []
+        except Exception as e:
+            print(f"❌ Error in detection thread: {e}")
+            self.running = False
+
+    def read(self, timeout=0.01):
+        """Returns the next (frame, (xyxy, conf, cls)) result, or None if none is ready."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        """Stop the thread."""
+        self.running = False
+        self.thread.join()
+
+# --- Debug Display ---
+class DisplayWorker:
+    """
+    Owns the debug window on its own thread, so imshow and the GUI event
+    loop never hold up detection. Only the newest frame is kept: a frame
+    still waiting when the next one arrives is replaced.
+    """
+    def __init__(self, window_name, frame_w, frame_h):
+        self.window_name = window_name
+        self.frame_size = (frame_w, frame_h)
+        self.queue = queue.Queue(maxsize=1)
+        self.quit_requested = False
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def show(self, frame):
+        """Hands a frame to the window, replacing one that has not been shown yet."""
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        """Internal thread target function."""
+        frame_w, frame_h = self.frame_size
+        # Let the window system downscale the preview instead of resizing every frame
+        cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)
+        cv2.resizeWindow(self.window_name, DISPLAY_WIDTH, int(DISPLAY_WIDTH * frame_h / frame_w))
+        while self.running:
+            try:
+                cv2.imshow(self.window_name, self.queue.get(timeout=0.03))
+            except queue.Empty:
+                pass
+            # Check for 'q' key to quit
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                print("'q' pressed. Stopping detection...")
+                self.quit_requested = True
+        cv2.destroyAllWindows()
+
+    def stop(self):
+        """Stop the thread and close the window."""
+        self.running = False
+        self.thread.join()
+
+def _raise_keyboard_interrupt(signum, frame):
+    """Turns SIGTERM (e.g. from the dashboard server) into the Ctrl+C shutdown path."""
+    raise KeyboardInterrupt
+
 # --- Utility Functions ---
 
 def load_settings(filepath=SETTINGS_FILE):
@@ -129,30 +335,49 @@ def load_zones(filepath=ZONES_FILE):
 
 def scale_zones(zones, sx, sy):
     """Scales polygon coordinates by the given scaling factors."""
-    scaled = {}
-    for name, poly in zones.items():
-        scaled[name] = np.array([[int(x * sx), int(y * sy)] for [x, y] in poly], dtype=np.int32)
-    return scaled
-
-def box_center_in_zone(box, zones):
-    """Checks if the center of a bounding box is inside any of the defined zones."""
-    x1, y1, x2, y2 = box
-    center_point = (int((x1 + x2) / 2), int((y1 + y2) / 2))
-    for name, poly in zones.items():
-        if cv2.pointPolygonTest(poly, center_point, False) >= 0:
-            return True, name
-    return False, None
-
-def send_to_dashboard(log_data):
-    """Sends violation data to the dashboard server."""
-    try:
-        requests.post(DASHBOARD_URL, json=log_data, timeout=1)
-        print(f"Sent violation ID {log_data['track_id']} to dashboard.")
-    except requests.exceptions.ConnectionError:
-        print(f"Error: Could not connect to dashboard server at {DASHBOARD_URL}.")
-    except Exception as e:
-        print(f"Error sending to dashboard: {e}")
-
+    scale = np.array([sx, sy], dtype=np.float32)
+    return {name: np.rint(poly.astype(np.float32) * scale).astype(np.int32) for name, poly in zones.items()}
+
+_scaled_zones_cache = {}
+
+def get_scaled_zones(zones, src_w, src_h, frame_w, frame_h):
+    """Returns zones scaled from the source image size to the frame size, cached per size pair."""
+    key = (src_w, src_h, frame_w, frame_h)
+    if key not in _scaled_zones_cache:
+        _scaled_zones_cache[key] = scale_zones(zones, frame_w / src_w, frame_h / src_h)
+    return _scaled_zones_cache[key]
+
+def build_class_mask(names, class_labels):
+    """Returns a boolean array indexed by class id, True where the class label is in class_labels."""
+    mask = np.zeros(max(names, default=-1) + 1, dtype=bool)
+    for class_id, name in names.items():
+        mask[class_id] = name in class_labels
+    return mask
+
+def build_zone_map(zones, frame_shape):
+    """
+    Rasterizes the zones once into a lookup image where each pixel holds
+    (zone index + 1), or 0 outside every zone. The image only covers the
+    zones' combined bounding box, clipped to the frame; points outside it
+    are rejected without a lookup.
+
+    Returns:
+        tuple: (zone_map, (origin_x, origin_y)) where origin is the frame
+        position of the map's top-left pixel.
+    """
+    if len(zones) > 255:
+        raise ValueError("At most 255 zones are supported.")
+    frame_h, frame_w = frame_shape[:2]
+    if not zones:
+        return np.zeros((0, 0), dtype=np.uint8), (0, 0)
+    points = np.concatenate(list(zones.values()))
+    x0, y0 = np.clip(points.min(axis=0), 0, [frame_w, frame_h])
+    x1, y1 = np.clip(points.max(axis=0) + 1, 0, [frame_w, frame_h])
+    zone_map = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+    # Paint in reverse so the first zone wins where zones overlap, as before.
+    for zone_id, poly in reversed(list(enumerate(zones.values()))):
+        cv2.fillPoly(zone_map, [poly], zone_id + 1, offset=(-int(x0), -int(y0)))
+    return zone_map, (int(x0), int(y0))
 
 # --- Core Processing ---
 
@@ -175,26 +400,37 @@ def run_violation_detection():
     except FileNotFoundError as e:
         print(f"❌ Error: {e}"); return
 
-    # 3. Initialize YOLO Model
+    # 3. Initialize ONNX Runtime Detector
     try:
-        model = YOLO(MODEL_PATH)
-        model.to(DEVICE)
+        model_path = INT8_MODEL_PATH if os.path.exists(INT8_MODEL_PATH) else MODEL_PATH
+        print(f"Loading model '{model_path}'...")
+        detector = OnnxDetector(model_path, device=DEVICE, conf_threshold=CONF_THRESHOLD,
+                                iou_threshold=IOU_THRESHOLD, classes=TARGET_CLASSES)
     except Exception as e:
-        print(f"❌ Error loading YOLO model: {e}"); return
+        print(f"❌ Error loading ONNX model: {e}"); return
+
+    violation_class_mask = build_class_mask(detector.names, VIOLATION_CLASSES)
+
+    # Warm the model up while the stream connects and delivers its first frame
+    warmup_thread = threading.Thread(target=detector.warmup, daemon=True)
+    warmup_thread.start()
 
     # 4. Setup Threaded Video Capture
     try:
-        stream = VideoStream(video_source)
+        # Frames held downstream: a batch in inference (with the skipped frames between
+        # its members), the queued results, one in the main loop
+        stream = VideoStream(video_source,
+                             ring_slots=DETECTION_QUEUE_SIZE + detector.batch_size * DETECT_EVERY_N_FRAMES + 2)
     except IOError as e:
         print(f"❌ Error: {e}"); return
 
     # 5. Get first frame for scaling
     print("Waiting for first frame from stream...")
-    time.sleep(2.0) # Give stream time to populate
-    first_frame = stream.read()
+    first_frame = stream.read(timeout=10.0)
     if first_frame is None:
         print("❌ Error: Could not get first frame from stream.")
         stream.stop(); return
+    warmup_thread.join()
         
     frame_h, frame_w = first_frame.shape[:2]
 
@@ -202,76 +438,105 @@ def run_violation_detection():
     target_fps = stream.source_fps if getattr(stream, "source_fps", 0) else 30.0
     
     # 6. Scale Zones
-    sx = frame_w / src_w
-    sy = frame_h / src_h
-    scaled_zones = scale_zones(original_zones, sx, sy)
+    scaled_zones = get_scaled_zones(original_zones, src_w, src_h, frame_w, frame_h)
+    zone_map, zone_origin = build_zone_map(scaled_zones, first_frame.shape)
+    zone_frame_hw = first_frame.shape[:2]
+    zone_names = list(scaled_zones.keys())
+    zone_polys = list(scaled_zones.values())
 
     # 7. Initialize Tracking State
-    zone_timers = {}
+    tracker = ByteTrackTracker(frame_rate=target_fps)
+    zone_timers = ZoneTimers()
     violation_history = {}
+    dashboard = DashboardClient(DASHBOARD_URL)
+    snapshot_writer = SnapshotWriter(first_frame.shape, LOG_DIR, on_written=dashboard.send)
     
-    print(f"\n Starting real-time detection on {DEVICE.upper()}... Press 'q' in the window to quit.")
+    # The debug window is opt-in; headless runs skip all drawing and GUI work
+    display = DisplayWorker(WINDOW_NAME, frame_w, frame_h) if DISPLAY_ENABLED else None
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+
+    if display:
+        print(f"\n Starting real-time detection on {detector.device.upper()}... Press 'q' in the window to quit.")
+    else:
+        print(f"\n Starting real-time detection on {detector.device.upper()}... Press Ctrl+C to stop.")
     
     # --- FPS & Session Tracking ---
     frame_count = 0
-    start_time = time.time()
+    fps_window_start_ns = time.monotonic_ns()
     processing_fps = target_fps if target_fps else 0.0
     total_frames_processed = 0
-    session_start_time = time.time()
+    session_start_ns = time.monotonic_ns()
+
+    # Inference runs on its own thread; this loop tracks, draws and displays
+    detection_worker = DetectionWorker(stream, detector)
+
+    # Hoisted out of the per-detection loop to skip repeated attribute lookups
+    names = detector.names
+    FONT = cv2.FONT_HERSHEY_SIMPLEX
+    rectangle = cv2.rectangle
+    putText = cv2.putText
 
     # Main detection loop
     try:
         while True:
-            frame = stream.read()
-            if frame is None:
-                time.sleep(0.01) # Wait for a new frame
+            result = detection_worker.read()
+            if result is None:
+                if not detection_worker.running:
+                    break
                 continue
+            frame, (det_xyxy, det_conf, det_cls) = result
             
+            # One clock read per frame, shared by the zone timers and FPS counter
+            now_ns = time.monotonic_ns()
             frame_count += 1
             total_frames_processed += 1
 
-            # 7. Run Model Tracking
-            results = model.track(frame, persist=True, tracker="bytetrack.yaml", verbose=False, 
-                                  device=DEVICE, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, 
-                                  classes=[2, 3])[0] # 2 car, 3 motorcycle, 0 is motorcycle in custom model
-
-            if results.boxes.id is not None:
-                boxes = results.boxes.xyxy.cpu().numpy()
-                track_ids = results.boxes.id.int().cpu().tolist()
-                clss = results.boxes.cls.cpu().tolist()
-                confs = results.boxes.conf.cpu().tolist()
+            # Overlays go on a separate UMat so drawing can run through OpenCL
+            # (T-API) and the raw frame stays clean for snapshots. It is only
+            # built on frames that are actually shown.
+            show_frame = display is not None and total_frames_processed % DISPLAY_EVERY_N_FRAMES == 0
+            display_frame = cv2.UMat(frame) if show_frame else None
+
+            # 7. Run Tracking on the worker's detections
+            boxes, track_ids, clss, confs = tracker.update(det_xyxy, det_conf, det_cls)
+
+            if frame.shape[:2] != zone_frame_hw:
+                # The source reconnected at a different resolution: rescale the zones to match
+                frame_h, frame_w = frame.shape[:2]
+                scaled_zones = get_scaled_zones(original_zones, src_w, src_h, frame_w, frame_h)
+                zone_map, zone_origin = build_zone_map(scaled_zones, frame.shape)
+                zone_frame_hw = frame.shape[:2]
+                zone_polys = list(scaled_zones.values())
+
+            if len(track_ids):
+                # One cast to int32 serves the zone lookup, drawing and logging
+                boxes = boxes.astype(np.int32)
+                # Zone lookup, violating-class check and timer update in one pass;
+                # elapsed is -1 for detections that are not violating
+                zone_indices, elapsed = zone_timers.update(boxes, clss, track_ids, zone_map, zone_origin,
+                                                           violation_class_mask, now_ns)
+                elapsed = elapsed.tolist()
+
+                boxes = boxes.tolist()
+                track_ids = track_ids.tolist()
+                clss = clss.tolist()
+                confs = confs.tolist()
+                zone_indices = zone_indices.tolist()
                 
                 current_frame_track_ids = set(track_ids)
-                frame_time = time.time()
 
-                for box, track_id, cls_id, conf in zip(boxes, track_ids, clss, confs):
-                    x1, y1, x2, y2 = map(int, box)
-                    label = model.names[int(cls_id)]
-                    
-                    is_in_zone, zone_name = box_center_in_zone((x1, y1, x2, y2), scaled_zones)
+                for box, track_id, cls_id, conf, zone_index, elapsed_in_zone in zip(boxes, track_ids, clss, confs, zone_indices, elapsed):
+                    x1, y1, x2, y2 = box
+                    zone_name = zone_names[zone_index] if zone_index >= 0 else None
 
                     # Default color is green
                     color = (0, 255, 0) 
 
-                    # Violation condition: specific classes in any zone
-                    if is_in_zone and label in ['motorcycle']:
-                        if track_id not in zone_timers:
-                            # Vehicle just entered the zone
-                            zone_timers[track_id] = {
-                                "enter_time": frame_time,
-                                "last_seen": frame_time,
-                            }
-                            elapsed_in_zone = 0
-                        else:
-                            # Vehicle is still in the zone
-                            timer_state = zone_timers[track_id]
-                            elapsed_in_zone = frame_time - timer_state["enter_time"]
-                            timer_state["last_seen"] = frame_time
-
+                    if elapsed_in_zone >= 0:
                         # Yellow for potential violation
                         color = (0, 255, 255) 
 
-                        if elapsed_in_zone >= VIOLATION_THRESHOLD_SECONDS:
+                        if elapsed_in_zone >= VIOLATION_THRESHOLD_NS:
                             # Red for confirmed violation
                             color = (0, 0, 255) 
 
@@ -279,18 +544,18 @@ def run_violation_detection():
                                 timestamp_str = time.strftime("%Y%m%d-%H%M%S")
                                 
                                 # --- Create Snapshot ---
-                                snapshot_frame = frame.copy() 
+                                snapshot_frame, snapshot_index = snapshot_writer.copy_frame(frame)
                                 # Draw the violation zone polygon in red on the snapshot frame
                                 cv2.polylines(snapshot_frame, [scaled_zones[zone_name]], isClosed=True, color=(0, 0, 255), thickness=2)
-                                cv2.rectangle(snapshot_frame, (x1, y1), (x2, y2), (0, 0, 255), 2) 
-                                text = f"ID: {int(track_id)} ({conf:.2f})" 
-                                cv2.putText(snapshot_frame, text, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2) # [cite: raftoxx2nd/cdp-parking-violation/CDP-Parking-Violation-80add89edd0f763d4e0f95f31ba8742671a67dc8/main.py]
+                                rectangle(snapshot_frame, (x1, y1), (x2, y2), (0, 0, 255), 2) 
+                                text = f"ID: {track_id} ({conf:.2f})" 
+                                putText(snapshot_frame, text, (x1, y1 - 10), FONT, 0.7, (0, 0, 255), 2) # [cite: raftoxx2nd/cdp-parking-violation/CDP-Parking-Violation-80add89edd0f763d4e0f95f31ba8742671a67dc8/main.py]
                                 
                                 snapshot_filename_rel = f"snapshots/violation_{timestamp_str}_id{track_id}.jpg"
                                 snapshot_filename_abs = os.path.join(SNAPSHOT_DIR, f"violation_{timestamp_str}_id{track_id}.jpg")
-                                cv2.imwrite(snapshot_filename_abs, snapshot_frame)
                                 
                                 # --- Create Log ---
+                                label = names[cls_id]
                                 log_data = {
                                     "track_id": track_id,
                                     "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
@@ -301,77 +566,69 @@ def run_violation_detection():
                                     "snapshot_file": f"output/{snapshot_filename_rel}" 
                                 }
                                 
+                                # Only used with PV_PRETTY_LOGS=1; otherwise the log goes to output/logs/violations.ndjson
                                 log_filename = os.path.join(LOG_DIR, f"violation_{timestamp_str}_id{track_id}.json")
-                                with open(log_filename, 'w') as f:
-                                    json.dump(log_data, f, indent=4)
+
+                                # Snapshot and log are written in the background, then sent to the dashboard
+                                snapshot_writer.submit(snapshot_filename_abs, snapshot_frame, log_filename, log_data, snapshot_index)
 
                                 violation_history[track_id] = zone_name
                                 print(f"🔴 VIOLATION: Vehicle ID {int(track_id)} in '{zone_name}'.")
-                                
-                                # Send to dashboard
-                                threading.Thread(target=send_to_dashboard, args=(log_data,), daemon=True).start()
                     # TODO: else clause to handle vehicles outside zones but it is also handled below using grace period
                     # but I'm not sure if bounding box that dissapear in the violating zone and bounding box
                     # that appear and left the violating zone are somehow the same or no, and I don't know what im doing.
 
-                    # Draw bounding box and ID on the frame
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                    text = f"ID: {int(track_id)} ({conf:.2f})"
-                    cv2.putText(frame, text, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-
-                # Prune timers for tracks that have been gone for the grace period
-                current_time = time.time()
-                for track_id in list(zone_timers.keys()):
-                    # A track is considered "gone" if it hasn't been seen *inside a zone* for the grace period.
-                    # The 'last_seen' timestamp is only updated when a vehicle is in a zone.
-                    if current_time - zone_timers[track_id]["last_seen"] > TRACK_GRACE_PERIOD_SECONDS:
-                        # If the vehicle that disappeared was a violator, log it and send event.
-                        if track_id in violation_history:
-                            print(f"CLEARED: Violating Vehicle ID {track_id} left the area or disappeared.")
-                            # TODO: Send "violation_cleared" event to dashboard
-                            violation_history.pop(track_id, None)
-
-                        # Always remove from timers if it's gone.
-                        zone_timers.pop(track_id, None)
-
-            # Draw the defined zones on the frame
-            for name, poly in scaled_zones.items():
-                cv2.polylines(frame, [poly], isClosed=True, color=(255, 255, 0), thickness=2) 
+                    # Draw bounding box and ID on the display frame
+                    if show_frame:
+                        rectangle(display_frame, (x1, y1), (x2, y2), color, 2)
+                        text = f"ID: {track_id} ({conf:.2f})"
+                        putText(display_frame, text, (x1, y1 - 10), FONT, 0.7, color, 2)
+
+                # Prune timers for tracks that have been gone for the grace period, in one array sweep.
+                # A track is considered "gone" if it hasn't been seen *inside a zone* for the grace period.
+                # The 'last_seen' timestamp is only updated when a vehicle is in a zone.
+                for track_id in zone_timers.expire(now_ns, TRACK_GRACE_PERIOD_NS).tolist():
+                    # If the vehicle that disappeared was a violator, log it and send event.
+                    if track_id in violation_history:
+                        print(f"CLEARED: Violating Vehicle ID {track_id} left the area or disappeared.")
+                        # TODO: Send "violation_cleared" event to dashboard
+                        violation_history.pop(track_id, None)
 
             # Calculate FPS
-            end_time = time.time()
-            elapsed = end_time - start_time
-            if elapsed >= 1.0:
-                processing_fps = frame_count / elapsed
+            elapsed_ns = now_ns - fps_window_start_ns
+            if elapsed_ns >= 1_000_000_000:
+                processing_fps = frame_count * 1e9 / elapsed_ns
                 frame_count = 0
-                start_time = time.time()
-
-            # Add FPS text to the frame
-            fps_text = f"FPS: {processing_fps:.2f} ({DEVICE.upper()})"
-            cv2.putText(frame, fps_text, (15, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 3)
+                fps_window_start_ns = now_ns
 
             # 7. Display Live View
-            aspect_ratio = frame.shape[0] / frame.shape[1]
-            display_height = int(DISPLAY_WIDTH * aspect_ratio)
-            display_frame = cv2.resize(frame, (DISPLAY_WIDTH, display_height))
-            cv2.imshow('Real-time Parking Violation Detection', display_frame) 
-
-            # Check for 'q' key to quit
-            if cv2.waitKey(1) & 0xFF == ord('q'): 
-                print("'q' pressed. Stopping detection...")
+            # The window scales the frame itself, so no per-frame cv2.resize is needed.
+            if show_frame:
+                # Draw the defined zones and FPS text on the display frame
+                if zone_polys: # polylines rejects an empty list, e.g. after all zones were cleared
+                    cv2.polylines(display_frame, zone_polys, isClosed=True, color=(255, 255, 0), thickness=2)
+                fps_text = f"FPS: {processing_fps:.2f} ({detector.device.upper()})"
+                putText(display_frame, fps_text, (15, 40), FONT, 1.2, (0, 255, 0), 3)
+                display.show(display_frame)
+
+            if display is not None and display.quit_requested:
                 break
 
     except KeyboardInterrupt:
         print("\nStopping detection (Ctrl+C)...")
     finally:
         # 8. Cleanup
-        session_end_time = time.time()
+        session_end_ns = time.monotonic_ns()
+        detection_worker.stop()
         stream.stop()
+        snapshot_writer.stop()
+        dashboard.stop()
         
-        cv2.destroyAllWindows() 
+        if display is not None:
+            display.stop()
         
         # --- Calculate Session Statistics ---
-        total_elapsed_time = session_end_time - session_start_time
+        total_elapsed_time = (session_end_ns - session_start_ns) / 1e9
         average_fps = 0
         if total_elapsed_time > 0:
             average_fps = total_frames_processed / total_elapsed_time
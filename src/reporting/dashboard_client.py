@@ -0,0 +1,68 @@
+import queue
+import threading
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class DashboardClient:
+    """
+    Sends violation data to the dashboard server from a single background
+    thread, reusing one keep-alive connection instead of a thread and TCP
+    handshake per violation.
+
+    The queue is bounded: if the server stalls, the oldest undelivered
+    violations are dropped so the live view catches up with the newest.
+    """
+    def __init__(self, url, timeout=1, max_pending=32):
+        self.url = url
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def send(self, log_data):
+        """Queues violation data for delivery; never blocks the caller."""
+        self._offer(log_data)
+
+    def _offer(self, item):
+        """Queues an item, dropping the oldest pending one while the queue is full."""
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self.queue.get_nowait()
+                except queue.Empty:
+                    continue # The worker took one in the meantime
+                if dropped is not None:
+                    print(f"Warning: Dashboard client is backed up, dropping violation ID {dropped['track_id']}.")
+
+    def _run(self):
+        """Internal thread target function."""
+        while True:
+            log_data = self.queue.get()
+            if log_data is None:
+                break
+            self._post(log_data)
+
+    def _post(self, log_data):
+        """Posts a single violation to the dashboard server."""
+        try:
+            self.session.post(self.url, data=orjson.dumps(log_data),
+                              headers={'Content-Type': 'application/json'}, timeout=self.timeout)
+            print(f"Sent violation ID {log_data['track_id']} to dashboard.")
+        except requests.exceptions.ConnectionError:
+            print(f"Error: Could not connect to dashboard server at {self.url}.")
+        except Exception as e:
+            print(f"Error sending to dashboard: {e}")
+
+    def stop(self, timeout=2.0):
+        """Flushes queued violations (best effort) and closes the session."""
+        self._offer(None)
+        self.thread.join(timeout)
+        self.session.close()
@@ -0,0 +1,156 @@
+import collections
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+import orjson
+
+try:
+    from turbojpeg import TJPF_BGR, TurboJPEG
+except ImportError:
+    TurboJPEG = None # libjpeg-turbo is optional; falls back to cv2.imencode
+
+# Violations are appended to a single NDJSON stream by default; set
+# PV_PRETTY_LOGS=1 to write one indented, human-readable file per violation instead.
+PRETTY_LOGS = os.environ.get("PV_PRETTY_LOGS", "0") == "1"
+VIOLATION_STREAM_NAME = 'violations.ndjson'
+
+
+class SnapshotWriter:
+    """
+    Encodes violation snapshots and writes them, together with their JSON
+    logs, on a background thread so the detection loop never waits on
+    libjpeg or the disk.
+
+    Snapshot frames come from a small pool of preallocated buffers that are
+    handed back once encoded, so violations do not allocate a full frame each.
+    """
+    def __init__(self, frame_shape, log_dir, on_written=None, jpeg_quality=75, max_pending=64, pool_size=4):
+        self.on_written = on_written
+        # Opened once and appended to, rather than creating a file per violation
+        self.log_stream = None
+        if not PRETTY_LOGS:
+            self.log_stream = open(os.path.join(log_dir, VIOLATION_STREAM_NAME), 'ab', buffering=1 << 16)
+        self.pool = [np.empty(frame_shape, dtype=np.uint8) for _ in range(pool_size)]
+        self.free_buffers = collections.deque(range(pool_size))
+        self.jpeg_quality = jpeg_quality
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.turbojpeg = None
+        if TurboJPEG is not None:
+            try:
+                self.turbojpeg = TurboJPEG()
+            except (OSError, RuntimeError) as e:
+                print(f"Warning: libjpeg-turbo could not be loaded ({e}), using OpenCV's JPEG encoder.")
+        self.max_pending = max_pending
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def copy_frame(self, frame):
+        """
+        Copies a frame into a free pooled buffer for annotation and submit().
+        Returns (snapshot_frame, pool_index); when every buffer is still in
+        flight, falls back to a plain copy with a pool_index of None.
+        """
+        try:
+            pool_index = self.free_buffers.popleft()
+        except IndexError:
+            return frame.copy(), None
+        snapshot_frame = self.pool[pool_index]
+        if snapshot_frame.shape != frame.shape:
+            self.free_buffers.append(pool_index)
+            return frame.copy(), None
+        np.copyto(snapshot_frame, frame)
+        return snapshot_frame, pool_index
+
+    def submit(self, snapshot_path, frame, log_path, log_data, pool_index=None):
+        """
+        Queues a snapshot for writing. The frame must not be modified by the
+        caller afterwards. Returns False if the writer is backed up.
+        """
+        try:
+            self.queue.put_nowait((snapshot_path, frame, log_path, log_data, pool_index))
+            return True
+        except queue.Full:
+            print(f"Warning: Snapshot writer is backed up, dropping snapshot for ID {log_data['track_id']}.")
+            self._release(pool_index)
+            return False
+
+    def _release(self, pool_index):
+        """Returns a pooled buffer to the free list."""
+        if pool_index is not None:
+            self.free_buffers.append(pool_index)
+
+    def _run(self):
+        """Internal thread target function."""
+        while True:
+            # Drain everything that is pending in one pass to amortize wakeups.
+            batch = [self.queue.get()]
+            while len(batch) < self.max_pending:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                if item is None:
+                    self._close_log_stream()
+                    return
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    # A failed snapshot must not stop the thread and leave stop() facing a full queue
+                    print(f"Error writing snapshot '{item[0]}': {e}")
+            # One flush per batch keeps the stream's write syscalls batched too.
+            if self.log_stream:
+                self.log_stream.flush()
+
+    def _close_log_stream(self):
+        """Flushes and closes the violation stream."""
+        if self.log_stream:
+            self.log_stream.close()
+            self.log_stream = None
+
+    def _encode(self, frame):
+        """Encodes a BGR frame to JPEG bytes, or returns None on failure."""
+        if self.turbojpeg:
+            # SIMD libjpeg-turbo, straight from the BGR buffer
+            return self.turbojpeg.encode(frame, quality=self.jpeg_quality, pixel_format=TJPF_BGR)
+        is_success, buffer = cv2.imencode('.jpg', frame, self.encode_params)
+        return buffer if is_success else None
+
+    def _write(self, snapshot_path, frame, log_path, log_data, pool_index):
+        """Writes one snapshot and its log, then notifies the listener."""
+        try:
+            try:
+                jpeg = self._encode(frame)
+            finally:
+                self._release(pool_index)
+            if jpeg is None:
+                print(f"Error: Failed to encode snapshot '{snapshot_path}'.")
+                return
+            with open(snapshot_path, 'wb') as f:
+                f.write(jpeg)
+            if self.log_stream:
+                self.log_stream.write(orjson.dumps(log_data) + b'\n')
+            else:
+                with open(log_path, 'wb') as f:
+                    f.write(orjson.dumps(log_data, option=orjson.OPT_INDENT_2))
+        except OSError as e:
+            print(f"Error writing snapshot '{snapshot_path}': {e}")
+            return
+
+        # The dashboard loads the snapshot as soon as it hears about the
+        # violation, so only notify once the file is on disk.
+        if self.on_written:
+            self.on_written(log_data)
+
+    def stop(self, timeout=5.0):
+        """Writes out pending snapshots (best effort) and stops the thread."""
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            print("Warning: Snapshot writer did not drain in time, dropping pending snapshots.")
+            return
+        self.thread.join(timeout)
@@ -1,10 +1,14 @@
 import aiohttp
 from aiohttp import web
+import asyncio
+import functools
 import json
+import orjson
 import os
 import weakref
 import subprocess
 import sys
+import threading
 import time
 import webbrowser # Optional: for auto-opening browser
 
@@ -20,6 +24,8 @@ except ImportError:
 print("Dashboard Server starting...")
 
 # --- Globals ---
+# orjson instead of the stdlib encoder for every JSON response
+json_response = functools.partial(web.json_response, dumps=lambda obj: orjson.dumps(obj).decode())
 WS_CLIENTS = weakref.WeakSet()
 detection_process = None
 DETECTION_STATUS = {"status": "stopped", "pid": None}
@@ -83,6 +89,141 @@ def restart_detection_process():
     time.sleep(1) 
     start_detection_process()
 
+# --- Cached Frame Source ---
+FRAME_CAPTURE_IDLE_SECONDS = 30 # The capture is released after this long without a /api/frame request
+FRAME_CAPTURE_JOIN_SECONDS = 10 # How long closing waits for a read that is still blocked on the source
+
+class LatestFrameCapture:
+    """
+    Serves /api/frame from a capture that is opened on the first request and
+    kept open while the Zone Editor keeps asking, so repeated requests skip
+    the connect and codec probe. The background thread only grab()s to stay
+    on the live edge and retrieve()s a frame when one is requested; after
+    FRAME_CAPTURE_IDLE_SECONDS without requests it releases the source again,
+    so the server holds no RTSP session or webcam while nobody is editing.
+    File sources are read once and their first frame is reused.
+
+    All public methods block and are meant to run in an executor.
+    """
+    def __init__(self):
+        self._lock = threading.Lock() # Serializes requests against source changes and close()
+        self._cond = threading.Condition() # Hands frames from the capture thread to the requester
+        self.source = None
+        self.is_file_source = False
+        self.thread = None
+        self._stop = None
+        self._active = False
+        self._wanted = False
+        self._last_request = 0.0
+        self._frame = None
+        self._frame_id = 0
+        self._jpeg = None
+        self._jpeg_id = 0
+
+    def _run(self, source, stop):
+        """Internal thread target function."""
+        from src.capture.stream_handler import get_video_capture
+        cap = None
+        try:
+            cap = get_video_capture(source)
+            while not stop.is_set():
+                if not cap.grab():
+                    if self.is_file_source:
+                        return
+                    print("Frame capture: no frame returned, reconnecting...")
+                    cap.release()
+                    cap = None
+                    time.sleep(1.0)
+                    cap = get_video_capture(source)
+                    continue
+                with self._cond:
+                    if time.monotonic() - self._last_request > FRAME_CAPTURE_IDLE_SECONDS:
+                        return
+                    wanted = self._wanted
+                if not wanted:
+                    continue
+                ret, frame = cap.retrieve()
+                if not ret:
+                    continue
+                with self._cond:
+                    self._frame = frame
+                    self._frame_id += 1
+                    self._wanted = False
+                    self._cond.notify_all()
+                if self.is_file_source:
+                    return
+        except IOError as e:
+            print(f"Error opening frame source: {e}")
+        finally:
+            if cap is not None:
+                cap.release()
+            with self._cond:
+                if self.thread is threading.current_thread():
+                    self._active = False
+                self._cond.notify_all()
+
+    def _close(self):
+        """Stops the capture thread and waits for it to release the source."""
+        thread, self.thread = self.thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(FRAME_CAPTURE_JOIN_SECONDS)
+        if thread.is_alive():
+            print(f"Warning: frame capture for {self.source} did not stop within {FRAME_CAPTURE_JOIN_SECONDS}s.")
+        with self._cond:
+            self._active = False
+
+    def close(self):
+        """Releases the source, e.g. before the detection process opens it."""
+        with self._lock:
+            self._close()
+
+    def latest_jpeg(self, source, timeout=5.0):
+        """Returns a current frame of source as JPEG bytes, or None if none arrived in time."""
+        import cv2
+        with self._lock:
+            if source != self.source:
+                self._close()
+                self.source = source
+                self.is_file_source = os.path.exists(str(source))
+                self._frame, self._frame_id = None, 0
+                self._jpeg, self._jpeg_id = None, 0
+
+            with self._cond:
+                self._last_request = time.monotonic() # Also keeps a running thread from idling out
+                need_frame = not (self.is_file_source and self._frame_id)
+                start = need_frame and not self._active
+            if start:
+                self._close() # Reap a thread that idled out or failed to open the source
+                self._stop = threading.Event()
+                self._active = True
+                self.thread = threading.Thread(target=self._run, args=(source, self._stop), daemon=True)
+                self.thread.start()
+
+            with self._cond:
+                if need_frame:
+                    wanted_id = self._frame_id + 1
+                    self._wanted = True
+                    self._cond.wait_for(lambda: self._frame_id >= wanted_id or not self._active, timeout)
+                frame, frame_id = self._frame, self._frame_id
+                if frame is None:
+                    return None
+                if frame_id == self._jpeg_id:
+                    return self._jpeg
+
+            is_success, buffer = cv2.imencode(".jpg", frame)
+            if not is_success:
+                return None
+            self._jpeg, self._jpeg_id = buffer.tobytes(), frame_id
+            return self._jpeg
+
+FRAME_CAPTURE_KEY = web.AppKey("frame_capture", LatestFrameCapture)
+
+async def close_frame_capture(app):
+    """Releases the Zone Editor's capture without blocking the event loop."""
+    await asyncio.get_running_loop().run_in_executor(None, app[FRAME_CAPTURE_KEY].close)
+
 # --- WebSocket Handlers ---
 async def websocket_handler(request):
     """Handles new browser WebSocket connections."""
@@ -111,15 +252,23 @@ async def violation_handler(request):
     Handles incoming violation data (HTTP POST) from the detection script.
     """
     try:
-        data = await request.json()
+        body = await request.read()
+        data = orjson.loads(body)
         print(f"Received violation for ID: {data.get('track_id')}")
         
-        # Broadcast the new violation data to all connected browsers
-        for ws in WS_CLIENTS:
-            try:
-                await ws.send_json(data)
-            except ConnectionResetError:
+        # Broadcast the new violation data to all connected browsers at once,
+        # so one slow client doesn't hold up the rest. The body is already
+        # valid JSON, so it is relayed as-is rather than re-encoded. It goes out
+        # as a text frame because the dashboard JSON.parse()s the message.
+        text = body.decode('utf-8')
+        clients = list(WS_CLIENTS)
+        results = await asyncio.gather(*(ws.send_str(text) for ws in clients), return_exceptions=True)
+        for ws, result in zip(clients, results):
+            if isinstance(result, ConnectionResetError):
                 print("Failed to send to a closed WebSocket.")
+                WS_CLIENTS.discard(ws)
+            elif isinstance(result, Exception):
+                print(f"Failed to send to a WebSocket: {result}")
         
         return web.Response(text="OK", status=200)
     except json.JSONDecodeError:
@@ -131,33 +280,34 @@ async def violation_handler(request):
 async def get_detection_status_handler(request):
     """Returns the current status of the detection process."""
     update_detection_status() # Ensure status is fresh
-    return web.json_response(DETECTION_STATUS)
+    return json_response(DETECTION_STATUS)
 
 async def start_detection_handler(request):
     """Handler to start the detection process."""
+    await close_frame_capture(request.app) # A webcam can only be opened by one process
     start_detection_process()
-    return web.json_response(DETECTION_STATUS)
+    return json_response(DETECTION_STATUS)
 
 async def stop_detection_handler(request):
     """Handler to stop the detection process."""
     stop_detection_process()
-    return web.json_response(DETECTION_STATUS)
+    return json_response(DETECTION_STATUS)
 
 async def get_settings_handler(request):
     """Serves the current settings."""
     try:
         with open(SETTINGS_FILE, 'r') as f:
             settings = json.load(f)
-        return web.json_response(settings)
+        return json_response(settings)
     except FileNotFoundError:
-        return web.json_response({"error": "Settings file not found."}, status=404)
+        return json_response({"error": "Settings file not found."}, status=404)
     except Exception as e:
-        return web.json_response({"error": f"Failed to read settings: {e}"}, status=500)
+        return json_response({"error": f"Failed to read settings: {e}"}, status=500)
 
 async def set_settings_handler(request):
     """Updates settings WITHOUT restarting the detection process."""
     try:
-        new_settings = await request.json()
+        new_settings = await request.json(loads=orjson.loads)
         
         # Optional: Add validation for the new_settings format here
         
@@ -165,10 +315,11 @@ async def set_settings_handler(request):
             json.dump(new_settings, f, indent=4)
         
         print(f"Settings updated. Source set to: {new_settings.get('video_source')}")
+        await close_frame_capture(request.app) # The next frame request opens the new source
         
-        return web.json_response({"status": "success", "message": "Settings updated. Go to Zone Editor to apply."})
+        return json_response({"status": "success", "message": "Settings updated. Go to Zone Editor to apply."})
     except Exception as e:
-        return web.json_response({"error": f"Failed to update settings: {e}"}, status=500)
+        return json_response({"error": f"Failed to update settings: {e}"}, status=500)
 
 async def get_frame_handler(request):
     """Captures and returns a single frame from the video source."""
@@ -180,23 +331,14 @@ async def get_frame_handler(request):
         if not video_source:
             return web.Response(text="Video source not configured.", status=400)
 
-        from src.capture.stream_handler import get_video_capture
-        cap = get_video_capture(video_source)
-        if not cap.isOpened():
-            return web.Response(text=f"Failed to open video source: {video_source}", status=500)
-        
-        ret, frame = cap.read()
-        cap.release()
-
-        if not ret or frame is None:
+        # The capture stays open between requests; waiting for and encoding
+        # a current frame happens off the event loop.
+        capture = request.app[FRAME_CAPTURE_KEY]
+        jpeg = await asyncio.get_running_loop().run_in_executor(None, capture.latest_jpeg, video_source)
+        if jpeg is None:
             return web.Response(text="Failed to capture frame from source.", status=500)
             
-        import cv2
-        is_success, buffer = cv2.imencode(".jpg", frame)
-        if not is_success:
-            return web.Response(text="Failed to encode frame.", status=500)
-            
-        return web.Response(body=buffer.tobytes(), content_type='image/jpeg')
+        return web.Response(body=jpeg, content_type='image/jpeg')
 
     except Exception as e:
         print(f"Error getting frame: {e}")
@@ -205,22 +347,23 @@ async def get_frame_handler(request):
 async def get_zones_handler(request):
     """Serves the current zones.json file."""
     if not os.path.exists(ZONES_FILE):
-        return web.json_response({}) # Return empty if no zones defined
+        return json_response({}) # Return empty if no zones defined
     return web.FileResponse(ZONES_FILE)
 
 async def save_zones_handler(request):
     """Saves new zone definitions and restarts detection."""
     try:
-        zones = await request.json()
+        zones = await request.json(loads=orjson.loads)
         with open(ZONES_FILE, 'w') as f:
             json.dump(zones, f, indent=4)
         
         print("Zones saved. Restarting detection process to apply changes...")
+        await close_frame_capture(request.app) # A webcam can only be opened by one process
         restart_detection_process() # Restart to load new zones
         
-        return web.json_response({"status": "success", "message": "Zones saved and detection restarted."})
+        return json_response({"status": "success", "message": "Zones saved and detection restarted."})
     except Exception as e:
-        return web.json_response({"error": f"Failed to save zones: {e}"}, status=500)
+        return json_response({"error": f"Failed to save zones: {e}"}, status=500)
 
 async def list_input_files_handler(request):
     """Lists all video files in the input directory."""
@@ -228,17 +371,17 @@ async def list_input_files_handler(request):
         input_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'input'))
         if not os.path.exists(input_dir):
             os.makedirs(input_dir)
-            return web.json_response({"files": []})
+            return json_response({"files": []})
         
         # List all video files
         video_extensions = ('.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm')
         files = [f for f in os.listdir(input_dir) if f.lower().endswith(video_extensions)]
         files.sort()
         
-        return web.json_response({"files": files})
+        return json_response({"files": files})
     except Exception as e:
         print(f"Error listing input files: {e}")
-        return web.json_response({"error": str(e)}, status=500)
+        return json_response({"error": str(e)}, status=500)
 
 async def index_handler(request):
     """Serves the main dashboard.html file."""
@@ -247,6 +390,8 @@ async def index_handler(request):
 def setup_app():
     """Configures and returns the aiohttp application."""
     app = web.Application()
+    app[FRAME_CAPTURE_KEY] = LatestFrameCapture()
+    app.on_cleanup.append(close_frame_capture)
     
     # --- Routes ---
     app.router.add_get('/', index_handler)
@@ -272,7 +417,10 @@ def setup_app():
         os.makedirs(output_dir)
         print(f"Created static directory: {output_dir}")
         
-    app.router.add_static('/output', path=output_dir, name='output')
+    # Snapshot JPEGs go out through FileResponse, which streams them with
+    # sendfile() on Linux (unless AIOHTTP_NOSENDFILE is set). Directory
+    # listings stay off so the event loop never walks the snapshot folder.
+    app.router.add_static('/output', path=output_dir, name='output', show_index=False)
     print(f"Serving static files from: {output_dir}")
 
     # Serve a general 'static' directory for assets like audio and icons